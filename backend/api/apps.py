@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class ApiConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "api"
+
+    def ready(self):
+        from api import signals  # noqa: F401
+
+        if settings.SERVER_TIMING:
+            from api.instrumentation import install_serializer_timing
+
+            install_serializer_timing()
@@ -4,3 +4,19 @@ MIN_COOKING_TIME = 1
 MAX_COOKING_TIME = 20160
 MIN_AMOUNT = 1
 MAX_AMOUNT = 1000
+MAX_BATCH_IDS = 100
+MAX_BATCH_ID = 2**63 - 1
+MAX_IMAGE_SIZE = 10 * 1024 * 1024
+MAX_IMAGE_PIXELS = 25_000_000
+SEARCH_CONFIG = "russian"
+SEARCH_HIGHLIGHT = ("<b>", "</b>")
+COOK_WITH_MIN_COVERAGE = 0.5
+COOK_WITH_MAX_RESULTS = 1000
+SIMILAR_RECIPES_LIMIT = 10
+SIMILAR_RECIPES_MAX_LIMIT = 50
+INGREDIENT_SUGGESTIONS_LIMIT = 10
+INGREDIENT_SUGGESTIONS_MAX_LIMIT = 50
+RECIPE_RANKINGS = {
+    "popular": "popular_score",
+    "trending": "trending_score",
+}
@@ -0,0 +1,132 @@
+from django import forms
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.uploadedfile import UploadedFile
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image
+
+from rest_framework import serializers
+from rest_framework.fields import ImageField
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+from .constants import MAX_IMAGE_PIXELS, MAX_IMAGE_SIZE
+from .images import variant_urls
+
+IMAGE_TOO_LARGE_MESSAGE = (
+    f"Размер изображения не должен превышать "
+    f"{MAX_IMAGE_SIZE // (1024 * 1024)} МБ."
+)
+IMAGE_TOO_MANY_PIXELS_MESSAGE = (
+    f"Изображение не должно содержать больше {MAX_IMAGE_PIXELS} пикселей."
+)
+
+
+class LimitedDjangoImageField(forms.ImageField):
+    """
+    Поле формы изображения с проверкой размера файла и числа пикселей
+
+    Размеры изображения читаются из заголовка файла, поэтому слишком
+    большие изображения отклоняются до декодирования.
+    """
+
+    def to_python(self, data):
+        if data is not None and data.size > MAX_IMAGE_SIZE:
+            raise forms.ValidationError(IMAGE_TOO_LARGE_MESSAGE)
+        if data is not None:
+            try:
+                with Image.open(data) as image:
+                    width, height = image.size
+            except Exception:
+                width = height = 0
+            data.seek(0)
+            if width * height > MAX_IMAGE_PIXELS:
+                raise forms.ValidationError(IMAGE_TOO_MANY_PIXELS_MESSAGE)
+        return super().to_python(data)
+
+
+class RecipeImageField(Base64ImageField):
+    """
+    Поле изображения рецепта
+
+    Принимает изображение в виде base64-строки в JSON или файлом из
+    multipart/form-data. Размер base64-строки проверяется до
+    декодирования.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("_DjangoImageField", LimitedDjangoImageField)
+        super().__init__(*args, **kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, UploadedFile):
+            return ImageField.to_internal_value(self, data)
+        if isinstance(data, str) and len(data) * 3 // 4 > MAX_IMAGE_SIZE:
+            raise serializers.ValidationError(IMAGE_TOO_LARGE_MESSAGE)
+        return super().to_internal_value(data)
+
+
+class ImageVariantsField(serializers.Field):
+    """
+    Поле с адресами уменьшенных копий изображения по ширине и формату
+    """
+
+    def __init__(self, **kwargs):
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, image):
+        request = self.context.get("request")
+        urls = variant_urls(image)
+        if request is None:
+            return urls
+        return {
+            width: {
+                image_format: request.build_absolute_uri(url)
+                for image_format, url in formats.items()
+            }
+            for width, formats in urls.items()
+        }
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """
+    Список связанных объектов по первичным ключам
+
+    Все объекты загружаются одним запросом, а не запросом на каждый ключ.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, "__iter__"):
+            self.fail("not_a_list", input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail("empty")
+
+        relation = self.child_relation
+        queryset = relation.get_queryset()
+        pks = []
+        for item in data:
+            try:
+                if isinstance(item, bool):
+                    raise TypeError
+                pks.append(queryset.model._meta.pk.to_python(item))
+            except (TypeError, ValueError, DjangoValidationError):
+                relation.fail("incorrect_type", data_type=type(item).__name__)
+        objects = queryset.in_bulk(pks)
+        for pk, item in zip(pks, data):
+            if pk not in objects:
+                relation.fail("does_not_exist", pk_value=item)
+        return [objects[pk] for pk in pks]
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Связанный объект по первичному ключу, с many=True загружаемый вместе
+    с остальными одним запросом
+    """
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {"child_relation": cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
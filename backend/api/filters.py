@@ -2,7 +2,10 @@ from django_filters import rest_framework as filters
 
 from rest_framework.filters import SearchFilter
 
-from recipes.models import Recipe
+from api.constants import RECIPE_RANKINGS
+from api.search import RecipeSearch
+from recipes.models import Recipe, Tag
+from users.models import CustomUser
 
 
 class IngredientSearchFilter(SearchFilter):
@@ -18,14 +21,47 @@ class RecipeFilter(filters.FilterSet):
     Класс фильтра для рецептов
     """
 
-    tags = filters.AllValuesMultipleFilter(field_name="tags__slug")
-    author = filters.AllValuesMultipleFilter(field_name="author__id")
+    # Значения проверяются запросом только по переданным slug и id, без
+    # выборки всех возможных вариантов
+    tags = filters.ModelMultipleChoiceFilter(
+        field_name="tags__slug",
+        to_field_name="slug",
+        queryset=Tag.objects.all(),
+    )
+    author = filters.ModelMultipleChoiceFilter(
+        field_name="author",
+        queryset=CustomUser.objects.only("id"),
+    )
     is_favorited = filters.BooleanFilter(method="filter_is_special")
     is_in_shopping_cart = filters.BooleanFilter(method="filter_is_special")
+    search = filters.CharFilter(method="filter_search")
+    ordering = filters.ChoiceFilter(
+        choices=(
+            ("popular", "Популярные"),
+            ("trending", "Популярные за последнее время"),
+        ),
+        method="filter_ordering",
+    )
 
     class Meta:
         model = Recipe
-        fields = ("tags", "author", "is_favorited", "is_in_shopping_cart")
+        fields = (
+            "tags",
+            "author",
+            "is_favorited",
+            "is_in_shopping_cart",
+            "search",
+            "ordering",
+        )
+
+    # Поиск по названию и описанию с сортировкой по релевантности
+    def filter_search(self, queryset, name, value):
+        return RecipeSearch.filter(queryset, value)
+
+    # Сортировка по рейтингу, пересчитанному командой
+    # update_recipe_rankings
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by(f"-{RECIPE_RANKINGS[value]}", "-id")
 
     # фильтрация по избранным рецептам или рецептам в списке покупок
     def filter_is_special(self, queryset, name, value):
@@ -35,11 +71,11 @@ class RecipeFilter(filters.FilterSet):
         filter_params = {}
         if name == "is_favorited":
             filter_params["favorite_recipes__user"] = (
-                self.request.user if value else None
+                self.request.user.id if value else None
             )
         elif name == "is_in_shopping_cart":
             filter_params["shopping_list_recipes__user"] = (
-                self.request.user if value else None
+                self.request.user.id if value else None
             )
 
         filter_params = {
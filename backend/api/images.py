@@ -0,0 +1,202 @@
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from threading import Lock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = "variants"
+VARIANT_EXTENSIONS = {"webp": "webp", "jpeg": "jpg"}
+VARIANT_SAVE_OPTIONS = {
+    "webp": {"quality": 80, "method": 4},
+    "jpeg": {"quality": 82, "optimize": True, "progressive": True},
+}
+
+# Копии перезаписываются командой generate_image_variants --force под
+# теми же именами, поэтому не кешируются как неизменяемые
+VARIANT_CACHE_CONTROL = "public, max-age=86400"
+
+_executor_lock = Lock()
+_executor = None
+
+
+# Исходные изображения хранятся по хешу содержимого, а копии - под
+# предсказуемыми именами в общем хранилище медиафайлов
+def get_image_storage():
+    return Recipe._meta.get_field("image").storage
+
+
+def get_variant_storage():
+    return default_storage
+
+
+def variant_name(source_name, width, image_format):
+    """
+    Возвращает имя файла уменьшенной копии изображения.
+
+    Копии лежат в каталоге variants/<исходное имя>/, поэтому по имени
+    копии всегда можно определить исходный файл.
+    """
+
+    extension = VARIANT_EXTENSIONS[image_format]
+    return f"{VARIANTS_DIR}/{source_name}/{width}.{extension}"
+
+
+def parse_variant_name(name):
+    """
+    Разбирает имя копии на исходное имя, ширину и формат.
+
+    :return: Кортеж (source_name, width, image_format) или None, если
+             имя не соответствует ни одной настроенной копии
+    """
+
+    prefix = f"{VARIANTS_DIR}/"
+    if not name.startswith(prefix) or ".." in name.split("/"):
+        return None
+    source_name, _, file_name = name[len(prefix):].rpartition("/")
+    width, _, extension = file_name.partition(".")
+    image_format = next(
+        (
+            image_format
+            for image_format, format_extension in VARIANT_EXTENSIONS.items()
+            if format_extension == extension
+        ),
+        None,
+    )
+    if (
+        not source_name
+        or not width.isdigit()
+        or int(width) not in settings.IMAGE_VARIANT_WIDTHS
+        or image_format not in settings.IMAGE_VARIANT_FORMATS
+    ):
+        return None
+    return source_name, int(width), image_format
+
+
+def generate_variant(source_name, width, image_format, force=False):
+    """
+    Создает уменьшенную копию изображения, если ее еще нет.
+
+    Изображения уже меньше заданной ширины не увеличиваются.
+
+    :return: Имя файла копии
+    """
+
+    storage = get_variant_storage()
+    name = variant_name(source_name, width, image_format)
+    if not force and storage.exists(name):
+        return name
+
+    with get_image_storage().open(source_name) as source, Image.open(
+        source
+    ) as image:
+        image = ImageOps.exif_transpose(image)
+        if image_format == "jpeg" and image.mode != "RGB":
+            image = image.convert("RGB")
+        image.thumbnail((width, image.height), Image.LANCZOS)
+        buffer = BytesIO()
+        image.save(
+            buffer, image_format, **VARIANT_SAVE_OPTIONS[image_format]
+        )
+    return save_variant(storage, name, buffer.getvalue())
+
+
+def save_variant(storage, name, data):
+    """
+    Записывает копию под точным именем, заменяя существующий файл.
+
+    В файловом хранилище копия пишется во временный файл и переносится
+    через os.replace, поэтому параллельное создание той же копии
+    фоновым потоком и запросом не оставляет файлов с суффиксом, а
+    читатели не видят недописанный файл.
+    """
+
+    try:
+        path = storage.path(name)
+    except NotImplementedError:
+        if storage.exists(name):
+            storage.delete(name)
+        return storage.save(name, ContentFile(data))
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "wb") as file:
+            file.write(data)
+        os.chmod(temporary, storage.file_permissions_mode or 0o644)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+    return name
+
+
+def generate_variants(source_name, force=False):
+    """
+    Создает все настроенные копии изображения.
+    """
+
+    return [
+        generate_variant(source_name, width, image_format, force)
+        for width in settings.IMAGE_VARIANT_WIDTHS
+        for image_format in settings.IMAGE_VARIANT_FORMATS
+    ]
+
+
+def _generate_variants_safely(source_name):
+    try:
+        generate_variants(source_name)
+    except Exception:
+        logger.exception("Не удалось создать копии для %s", source_name)
+
+
+def schedule_variants(source_name):
+    """
+    Ставит создание копий в фоновый пул потоков после фиксации транзакции.
+    """
+
+    global _executor
+
+    if not settings.IMAGE_VARIANT_WORKERS:
+        return
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_VARIANT_WORKERS,
+                thread_name_prefix="image-variants",
+            )
+    transaction.on_commit(
+        lambda: _executor.submit(_generate_variants_safely, source_name)
+    )
+
+
+def variant_urls(image):
+    """
+    Возвращает адреса копий изображения по ширине и формату.
+
+    Копии, которые еще не созданы, создаются при первом обращении.
+    """
+
+    if not image:
+        return {}
+    storage = get_variant_storage()
+    return {
+        str(width): {
+            image_format: storage.url(
+                variant_name(image.name, width, image_format)
+            )
+            for image_format in settings.IMAGE_VARIANT_FORMATS
+        }
+        for width in settings.IMAGE_VARIANT_WIDTHS
+    }
@@ -0,0 +1,135 @@
+import time
+from contextvars import ContextVar
+
+from rest_framework.serializers import BaseSerializer
+
+current_metrics = ContextVar("current_metrics", default=None)
+
+_serializer_data = BaseSerializer.data
+
+
+class RequestMetrics:
+    """
+    Показатели одного запроса
+
+    Число и время SQL-запросов, время сериализации, отрисовки ответа и
+    общее время, а также имя представления и действия DRF.
+    """
+
+    def __init__(self, request):
+        self.method = request.method
+        self.path = request.path
+        self.view = None
+        self.action = None
+        self.status = None
+        self.size = None
+        self.queries = 0
+        self.db_time = 0.0
+        # Без install_serializer_timing время сериализации не учитывается
+        self.serializer_time = (
+            0.0 if BaseSerializer.data is not _serializer_data else None
+        )
+        self.render_time = 0.0
+        self.total_time = 0.0
+        self.serializer_depth = 0
+        self.started = time.perf_counter()
+        self.render_started = None
+
+    # Обертка для connection.execute_wrapper, учитывающая каждый запрос
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - started
+
+    def set_view(self, view_func, method):
+        """
+        Запоминает представление и действие, обрабатывающие запрос.
+
+        Для ViewSet действие берется из сопоставления методов маршрута,
+        для остальных представлений совпадает с HTTP-методом.
+        """
+
+        view_class = getattr(view_func, "cls", None)
+        self.view = (view_class or view_func).__name__
+        actions = getattr(view_func, "actions", None) or {}
+        self.action = actions.get(method.lower(), method.lower())
+
+    @property
+    def route(self):
+        if self.view is None:
+            return "unresolved"
+        return f"{self.view}.{self.action}"
+
+    def finish(self, response):
+        self.total_time = time.perf_counter() - self.started
+        if self.render_started is not None:
+            self.render_time = time.perf_counter() - self.render_started
+        self.status = response.status_code
+        if response.streaming:
+            self.size = int(response.get("Content-Length", 0)) or None
+        else:
+            self.size = len(response.content)
+
+    def server_timing(self):
+        """
+        Возвращает значение заголовка Server-Timing в миллисекундах.
+        """
+
+        timings = [
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} SQL"',
+            f"render;dur={self.render_time * 1000:.1f}",
+            f"total;dur={self.total_time * 1000:.1f}",
+        ]
+        if self.serializer_time is not None:
+            timings.insert(
+                1, f"serializer;dur={self.serializer_time * 1000:.1f}"
+            )
+        return ", ".join(timings)
+
+    def as_dict(self):
+        return {
+            "method": self.method,
+            "path": self.path,
+            "view": self.view,
+            "action": self.action,
+            "status": self.status,
+            "size": self.size,
+            "queries": self.queries,
+            "db_ms": round(self.db_time * 1000, 2),
+            "serializer_ms": (
+                round(self.serializer_time * 1000, 2)
+                if self.serializer_time is not None
+                else None
+            ),
+            "render_ms": round(self.render_time * 1000, 2),
+            "total_ms": round(self.total_time * 1000, 2),
+        }
+
+
+def _timed_serializer_data(serializer):
+    metrics = current_metrics.get()
+    if metrics is None:
+        return _serializer_data.fget(serializer)
+    # Вложенные сериализаторы учитываются в общем времени внешнего
+    started = time.perf_counter()
+    metrics.serializer_depth += 1
+    try:
+        return _serializer_data.fget(serializer)
+    finally:
+        metrics.serializer_depth -= 1
+        if not metrics.serializer_depth:
+            metrics.serializer_time += time.perf_counter() - started
+
+
+def install_serializer_timing():
+    """
+    Включает учет времени сериализации в показателях текущего запроса.
+
+    Serializer.data и ListSerializer.data обращаются к BaseSerializer.data,
+    поэтому достаточно заменить одно свойство.
+    """
+
+    BaseSerializer.data = property(_timed_serializer_data)
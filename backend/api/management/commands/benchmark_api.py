@@ -0,0 +1,288 @@
+import base64
+import json
+import logging
+import math
+import subprocess
+import time
+from io import BytesIO
+from itertools import product
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from api.queries import QueryStats
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingList, Tag
+from users.models import CustomUser, Subscription
+
+RECIPE_FILTERS = ("tags", "author", "is_favorited", "is_in_shopping_cart")
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Замер задержки, числа SQL-запросов и полученных строк для основных "
+        "запросов API на заполненной базе. Изменения данных откатываются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--warmup", type=int, default=2)
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=6,
+            help="Размер страницы для списков.",
+        )
+        parser.add_argument(
+            "--user",
+            help="Имя пользователя, от которого выполняются запросы. По "
+            "умолчанию - пользователь с наибольшим числом подписок.",
+        )
+        parser.add_argument(
+            "--only",
+            help="Выполнить только сценарии, имя которых содержит строку.",
+        )
+        parser.add_argument(
+            "--output",
+            type=Path,
+            help="Сохранить результаты в JSON-файл.",
+        )
+        parser.add_argument(
+            "--compare",
+            type=Path,
+            help="Сравнить с результатами из ранее сохраненного файла.",
+        )
+
+    def handle(self, *args, **options):
+        if options["iterations"] < 1:
+            raise CommandError("--iterations должно быть больше нуля.")
+        self.options = options
+        self.client = APIClient(REMOTE_ADDR="192.0.2.1")
+        # Строки лога каждого запроса не нужны в выводе команды
+        logging.getLogger("api.requests").setLevel(logging.WARNING)
+
+        results = {}
+        with override_settings(ALLOWED_HOSTS=["testserver"]):
+            with transaction.atomic():
+                self.user = self.get_user()
+                self.client.force_authenticate(self.user)
+                for name, method, path, data in self.get_scenarios():
+                    if options["only"] and options["only"] not in name:
+                        continue
+                    results[name] = self.measure(method, path, data)
+                    self.stdout.write(self.format_result(name, results[name]))
+                transaction.set_rollback(True)
+
+        report = {"meta": self.get_meta(), "results": results}
+        if options["output"]:
+            options["output"].write_text(
+                json.dumps(report, ensure_ascii=False, indent=2)
+            )
+            self.stdout.write(f"Результаты сохранены в {options['output']}")
+        if options["compare"]:
+            self.compare(
+                json.loads(options["compare"].read_text())["results"], results
+            )
+
+    def get_user(self):
+        users = CustomUser.objects.filter(is_active=True)
+        if self.options["user"]:
+            user = users.filter(username=self.options["user"]).first()
+        else:
+            user = (
+                users.annotate(subscriptions=Count("following"))
+                .order_by("-subscriptions", "id")
+                .first()
+            )
+        if user is None:
+            raise CommandError(
+                "Пользователь не найден, заполните базу командой "
+                "generate_dataset."
+            )
+        return user
+
+    def get_scenarios(self):
+        """
+        Возвращает сценарии в виде (имя, метод, путь, данные).
+
+        Параметры фильтров берутся из данных выбранного пользователя.
+        """
+
+        recipe = Recipe.objects.order_by("-id").first()
+        ingredients = list(Ingredient.objects.order_by("id")[:3])
+        tags = list(Tag.objects.order_by("id")[:2])
+        if recipe is None or not ingredients or not tags:
+            raise CommandError("В базе нет рецептов, тегов или ингредиентов.")
+        author = (
+            Subscription.objects.filter(subscriber=self.user)
+            .values_list("subscribed_to_id", flat=True)
+            .first()
+            or recipe.author_id
+        )
+        limit = self.options["limit"]
+        filter_values = {
+            "tags": "&".join(f"tags={tag.slug}" for tag in tags),
+            "author": f"author={author}",
+            "is_favorited": "is_favorited=1",
+            "is_in_shopping_cart": "is_in_shopping_cart=1",
+        }
+
+        scenarios = []
+        for enabled in product((False, True), repeat=len(RECIPE_FILTERS)):
+            names = [
+                name for name, on in zip(RECIPE_FILTERS, enabled) if on
+            ]
+            query = "&".join(
+                [f"limit={limit}"] + [filter_values[name] for name in names]
+            )
+            scenarios.append(
+                (
+                    f"recipes:list[{','.join(names)}]",
+                    "get",
+                    f"/api/recipes/?{query}",
+                    None,
+                )
+            )
+
+        recipe_data = {
+            "ingredients": [
+                {"id": ingredient.id, "amount": 100}
+                for ingredient in ingredients
+            ],
+            "tags": [tag.id for tag in tags],
+            "image": self.image(),
+            "name": "Тестовый рецепт",
+            "text": "Описание тестового рецепта",
+            "cooking_time": 15,
+        }
+        own_recipe = self.client.post(
+            "/api/recipes/", recipe_data, format="json"
+        ).data["id"]
+        prefix = ingredients[0].name[:3]
+        scenarios += [
+            ("recipes:detail", "get", f"/api/recipes/{recipe.id}/", None),
+            (
+                "ingredients:search",
+                "get",
+                f"/api/ingredients/?name={prefix}",
+                None,
+            ),
+            (
+                "users:subscriptions",
+                "get",
+                f"/api/users/subscriptions/?limit={limit}",
+                None,
+            ),
+            (
+                "recipes:download_shopping_cart",
+                "get",
+                "/api/recipes/download_shopping_cart/",
+                None,
+            ),
+            ("recipes:create", "post", "/api/recipes/", recipe_data),
+            (
+                "recipes:update",
+                "patch",
+                f"/api/recipes/{own_recipe}/",
+                dict(recipe_data, cooking_time=20),
+            ),
+        ]
+        return scenarios
+
+    @staticmethod
+    def image():
+        buffer = BytesIO()
+        Image.new("RGB", (64, 48), "#49B64E").save(buffer, "PNG")
+        encoded = base64.b64encode(buffer.getvalue()).decode()
+        return f"data:image/png;base64,{encoded}"
+
+    def measure(self, method, path, data):
+        request = getattr(self.client, method)
+        for _ in range(self.options["warmup"]):
+            request(path, data, format="json")
+
+        timings, queries, rows = [], [], []
+        for _ in range(self.options["iterations"]):
+            with QueryStats() as stats:
+                started = time.perf_counter()
+                response = request(path, data, format="json")
+                timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                raise CommandError(
+                    f"{method.upper()} {path}: {response.status_code} "
+                    f"{getattr(response, 'data', '')}"
+                )
+            queries.append(stats.queries)
+            rows.append(stats.rows)
+
+        return {
+            "calls": len(timings),
+            "p50_ms": round(percentile(timings, 0.5), 2),
+            "p95_ms": round(percentile(timings, 0.95), 2),
+            "queries": max(queries),
+            "rows": max(rows),
+        }
+
+    @staticmethod
+    def format_result(name, result):
+        return (
+            f"{name:<60} p50 {result['p50_ms']:>8.2f} мс  "
+            f"p95 {result['p95_ms']:>8.2f} мс  "
+            f"запросов {result['queries']:>4}  строк {result['rows']:>6}"
+        )
+
+    def get_meta(self):
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            "commit": commit,
+            "created_at": timezone.now().isoformat(),
+            "database": connection.vendor,
+            "user": self.user.username,
+            "iterations": self.options["iterations"],
+            "limit": self.options["limit"],
+            "counts": {
+                model._meta.model_name: model.objects.count()
+                for model in (
+                    CustomUser,
+                    Recipe,
+                    Ingredient,
+                    Favorite,
+                    ShoppingList,
+                    Subscription,
+                )
+            },
+        }
+
+    def compare(self, baseline, results):
+        self.stdout.write("\nИзменения относительно сохраненных результатов:")
+        for name, result in results.items():
+            old = baseline.get(name)
+            if old is None:
+                continue
+            change = (result["p50_ms"] - old["p50_ms"]) / old["p50_ms"] * 100
+            line = (
+                f"{name:<60} p50 {change:>+7.1f}%  запросов "
+                f"{old['queries']} -> {result['queries']}  строк "
+                f"{old['rows']} -> {result['rows']}"
+            )
+            if result["queries"] > old["queries"]:
+                line = self.style.ERROR(line)
+            self.stdout.write(line)
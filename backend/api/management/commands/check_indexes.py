@@ -0,0 +1,153 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.utils import timezone
+
+from api.paginations import KeysetPagination
+from api.search import RecipeSearch
+from api.services import QuerySetService
+from recipes.models import Favorite, Recipe
+from users.models import CustomUser
+
+PAGE_SIZE = 6
+
+
+class Command(BaseCommand):
+    help = (
+        "Проверка по EXPLAIN, что основные запросы API используют индексы "
+        "из recipes.0010_hot_path_indexes. Запускается на базе, заполненной "
+        "командой generate_dataset."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--analyze",
+            action="store_true",
+            help="EXPLAIN (ANALYZE, BUFFERS) на PostgreSQL.",
+        )
+
+    def handle(self, *args, **options):
+        user = (
+            CustomUser.objects.annotate(items=Count("shopping_lists"))
+            .order_by("-items")
+            .first()
+        )
+        author = (
+            CustomUser.objects.annotate(recipes=Count("author_recipes"))
+            .order_by("-recipes")
+            .first()
+        )
+        if user is None or author is None:
+            raise CommandError(
+                "База пуста, заполните ее командой generate_dataset"
+            )
+
+        explain_options = {}
+        if options["analyze"] and connection.vendor == "postgresql":
+            explain_options = {"analyze": True, "buffers": True}
+
+        failed = 0
+        for label, queryset, indexes in self.hot_queries(user, author):
+            plan = queryset.explain(**explain_options)
+            missing = [index for index in indexes if index not in plan]
+            if missing:
+                failed += 1
+                self.stdout.write(
+                    self.style.ERROR(
+                        f"{label}: не используется {', '.join(missing)}"
+                    )
+                )
+            else:
+                self.stdout.write(f"{label}: {', '.join(indexes)}")
+            if missing or options["verbosity"] > 1:
+                for line in plan.splitlines():
+                    self.stdout.write(f"    {line}")
+
+        if failed:
+            raise CommandError(f"Индексы не используются в {failed} запросах")
+        self.stdout.write(self.style.SUCCESS("Все индексы используются"))
+
+    # Запросы в том виде, в котором их выполняют представления
+    @staticmethod
+    def hot_queries(user, author):
+        recipes = QuerySetService.recipes(user)
+        # SQLite называет индекс ограничения UNIQUE по таблице
+        recipe_ingredient_index = (
+            "unique_recipe_ingredient"
+            if connection.vendor == "postgresql"
+            else "sqlite_autoindex_recipes_recipeingredient_1"
+        )
+        queries = [
+            (
+                "Лента рецептов",
+                QuerySetService.recipes(AnonymousUser())[:PAGE_SIZE],
+                ("recipe_created_idx",),
+            ),
+            (
+                "Рецепты автора",
+                recipes.filter(author=author)[:PAGE_SIZE],
+                ("recipe_author_created_idx",),
+            ),
+            (
+                "Избранное пользователя",
+                recipes.filter(favorite_recipes__user=user)[:PAGE_SIZE],
+                ("favorite_user_recipe_idx",),
+            ),
+            (
+                "Список покупок пользователя",
+                recipes.filter(shopping_list_recipes__user=user)[:PAGE_SIZE],
+                ("shoppinglist_user_recipe_idx",),
+            ),
+            (
+                "Выгрузка списка покупок",
+                QuerySetService.shopping_cart(user),
+                (
+                    "shoppinglist_user_recipe_idx",
+                    recipe_ingredient_index,
+                ),
+            ),
+            (
+                "Признаки is_favorited и is_in_shopping_cart",
+                recipes[:PAGE_SIZE],
+                ("favorite_user_recipe_idx", "shoppinglist_user_recipe_idx"),
+            ),
+        ]
+        ranking = KeysetPagination("trending_score")
+        # Курсор после сотой страницы
+        cursor = (
+            Recipe.objects.order_by("-trending_score", "-id")
+            .values_list("trending_score", "id")[PAGE_SIZE * 100 - 1:]
+            .first()
+        )
+        queries += [
+            (
+                "Рецепты по рейтингу",
+                ranking.page_queryset(recipes)[:PAGE_SIZE],
+                ("recipe_trending_idx",),
+            ),
+            (
+                "Дальняя страница по рейтингу",
+                ranking.page_queryset(recipes, cursor)[:PAGE_SIZE],
+                ("recipe_trending_idx",),
+            ),
+            (
+                "Новые добавления для update_recipe_rankings",
+                Favorite.objects.filter(
+                    created_at__gt=timezone.now() - timedelta(minutes=10)
+                ).values_list("recipe_id", "created_at"),
+                ("favorite_created_idx",),
+            ),
+        ]
+        # Таблица FTS5 в SQLite не отображается в плане как индекс
+        if connection.vendor == "postgresql":
+            queries.append(
+                (
+                    "Полнотекстовый поиск",
+                    RecipeSearch.filter(recipes, "суп")[:PAGE_SIZE],
+                    ("recipe_search_idx",),
+                )
+            )
+        return queries
@@ -0,0 +1,168 @@
+import os
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models.functions import Collate
+
+from api.images import VARIANTS_DIR
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        "Удаление файлов из MEDIA_ROOT, на которые не ссылается ни один "
+        "рецепт. Каталог и список изображений из базы читаются потоково в "
+        "одинаковом порядке и сравниваются слиянием."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace-hours",
+            type=float,
+            default=24,
+            help="Не удалять файлы моложе указанного числа часов.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только показать, какие файлы будут удалены.",
+        )
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=0,
+            help="Максимум удалений в секунду, 0 - без ограничения.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="Размер пачки строк, читаемых из базы.",
+        )
+        parser.add_argument(
+            "--progress-every",
+            type=int,
+            default=1000,
+            help="Выводить прогресс через указанное число файлов.",
+        )
+
+    def handle(self, *args, **options):
+        self.root = Path(settings.MEDIA_ROOT)
+        self.cutoff = time.time() - options["grace_hours"] * 3600
+        self.options = options
+        self.scanned = self.removed = self.removed_bytes = 0
+        # Удаленные исходники, чтобы в режиме dry-run учесть их копии
+        self.orphans = set()
+
+        referenced = self.referenced_images()
+        reference = next(referenced, None)
+        for name, entry in self.walk(self.root, skip=VARIANTS_DIR):
+            while reference is not None and reference < name:
+                reference = next(referenced, None)
+            if reference != name:
+                self.collect(name, entry)
+
+        for name, entry in self.walk(self.root / VARIANTS_DIR):
+            source = name.rpartition("/")[0]
+            if source in self.orphans or not (self.root / source).exists():
+                self.collect(f"{VARIANTS_DIR}/{name}", entry, source=False)
+
+        action = "Будет удалено" if options["dry_run"] else "Удалено"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Просмотрено файлов: {self.scanned}. {action}: "
+                f"{self.removed} ({self.removed_bytes / 1024 / 1024:.1f} МБ)"
+            )
+        )
+
+    # Имена изображений из базы в порядке побайтового сравнения строк
+    def referenced_images(self):
+        images = Recipe.objects.exclude(image="").values_list(
+            "image", flat=True
+        )
+        if connection.vendor == "postgresql":
+            images = images.order_by(Collate("image", "C"))
+        else:
+            images = images.order_by("image")
+        return images.iterator(chunk_size=self.options["chunk_size"])
+
+    def walk(self, directory, prefix="", skip=None):
+        """
+        Обходит каталог, возвращая пары (относительное имя, DirEntry).
+
+        Элементы каждого каталога сортируются так, чтобы итоговые имена
+        шли в порядке сравнения строк: имя подкаталога сравнивается
+        вместе с завершающим "/". Элемент с именем skip пропускается
+        только на верхнем уровне.
+        """
+
+        if not directory.is_dir():
+            return
+        with os.scandir(directory) as iterator:
+            entries = sorted(
+                (
+                    entry
+                    for entry in iterator
+                    if not entry.name.startswith(".") and entry.name != skip
+                ),
+                key=self.sort_key,
+            )
+        for entry in entries:
+            name = prefix + entry.name
+            if entry.is_dir(follow_symlinks=False):
+                yield from self.walk(Path(entry.path), f"{name}/")
+            elif entry.is_file(follow_symlinks=False):
+                self.scanned += 1
+                if self.scanned % self.options["progress_every"] == 0:
+                    self.stdout.write(
+                        f"Просмотрено файлов: {self.scanned}, "
+                        f"к удалению: {self.removed}"
+                    )
+                yield name, entry
+
+    @staticmethod
+    def sort_key(entry):
+        if entry.is_dir(follow_symlinks=False):
+            return f"{entry.name}/"
+        return entry.name
+
+    def collect(self, name, entry, source=True):
+        stat = entry.stat(follow_symlinks=False)
+        if stat.st_mtime > self.cutoff or (
+            source and self.is_in_use(name, entry)
+        ):
+            return
+
+        self.orphans.add(name)
+        self.removed += 1
+        self.removed_bytes += stat.st_size
+        if self.options["dry_run"]:
+            self.stdout.write(f"Будет удален: {name}")
+            return
+
+        os.remove(entry.path)
+        self.remove_empty_parents(Path(entry.path).parent)
+        if self.options["rate"]:
+            time.sleep(1 / self.options["rate"])
+
+    # Список изображений прочитан до обхода каталога, поэтому перед
+    # удалением ссылка и время изменения проверяются еще раз: за время
+    # обхода файл мог быть загружен повторно
+    def is_in_use(self, name, entry):
+        try:
+            if os.stat(entry.path).st_mtime > self.cutoff:
+                return True
+        except FileNotFoundError:
+            return True
+        return Recipe.objects.filter(image=name).exists()
+
+    def remove_empty_parents(self, directory):
+        while directory != self.root and self.root in directory.parents:
+            try:
+                directory.rmdir()
+            except OSError:
+                return
+            directory = directory.parent
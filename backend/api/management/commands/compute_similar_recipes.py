@@ -0,0 +1,104 @@
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.constants import SIMILAR_RECIPES_MAX_LIMIT
+from api.recipe_index import SimilarityIndex
+from recipes.models import Recipe, RecipeIngredient, SimilarRecipe
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Расчет похожих рецептов по весам IDF ингредиентов. Результат "
+        "сохраняется в SimilarRecipe и отдается /api/recipes/{id}/similar/ "
+        "без расчета при запросе."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=SIMILAR_RECIPES_MAX_LIMIT,
+            help="Число похожих рецептов для каждого рецепта.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Число рецептов, сохраняемых в одной транзакции.",
+        )
+        parser.add_argument(
+            "--metric",
+            choices=("cosine", "jaccard"),
+            default=settings.SIMILAR_RECIPES_METRIC,
+        )
+
+    def handle(self, *args, **options):
+        limit = options["limit"]
+        if not 0 < limit <= SIMILAR_RECIPES_MAX_LIMIT:
+            raise CommandError(
+                f"--limit должен быть от 1 до {SIMILAR_RECIPES_MAX_LIMIT}"
+            )
+
+        started = time.perf_counter()
+        index = SimilarityIndex()
+        index.build()
+        self.stdout.write(
+            f"Индекс: {index.recipe_count} рецептов, "
+            f"{len(index.postings)} ингредиентов, "
+            f"{time.perf_counter() - started:.1f} с"
+        )
+
+        recipe_ids = (
+            Recipe.objects.order_by("id")
+            .values_list("id", flat=True)
+            .iterator(chunk_size=settings.RECIPE_INDEX_CHUNK_SIZE)
+        )
+        total = 0
+        for batch in batched(recipe_ids, options["batch_size"]):
+            ingredients = {recipe_id: [] for recipe_id in batch}
+            for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+                recipe_id__in=batch
+            ).values_list("recipe_id", "ingredient_id"):
+                ingredients[recipe_id].append(ingredient_id)
+
+            similar = [
+                SimilarRecipe(
+                    recipe_id=recipe_id,
+                    similar_id=similar_id,
+                    score=score,
+                )
+                for recipe_id in batch
+                for similar_id, score in index.score(
+                    recipe_id,
+                    ingredients[recipe_id],
+                    limit,
+                    options["metric"],
+                )
+            ]
+            with transaction.atomic():
+                SimilarRecipe.objects.filter(recipe_id__in=batch).delete()
+                SimilarRecipe.objects.bulk_create(similar)
+
+            total += len(batch)
+            self.stdout.write(
+                f"  {total} рецептов, "
+                f"{time.perf_counter() - started:.1f} с"
+            )
+
+        # Похожие рецепты удаленных рецептов удаляются каскадно
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Похожие рецепты рассчитаны для {total} рецептов за "
+                f"{time.perf_counter() - started:.1f} с"
+            )
+        )
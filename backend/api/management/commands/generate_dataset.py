@@ -0,0 +1,395 @@
+import csv
+import random
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+from itertools import accumulate, islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image
+
+from api.recipe_index import RecipeChanges
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingList,
+    Tag,
+)
+from users.models import CustomUser, Subscription
+
+FIRST_NAMES = (
+    "Анна", "Иван", "Мария", "Петр", "Ольга", "Сергей", "Елена", "Павел",
+)
+LAST_NAMES = (
+    "Иванов", "Смирнов", "Кузнецов", "Попов", "Соколов", "Лебедев",
+)
+DISHES = (
+    "Суп", "Салат", "Пирог", "Рагу", "Запеканка", "Каша", "Омлет", "Паста",
+)
+ADJECTIVES = (
+    "домашний", "быстрый", "летний", "острый", "нежный", "праздничный",
+)
+# Добавления в избранное и список покупок распределены по последним дням
+ACTIVITY_PERIOD = timedelta(days=30)
+DEFAULT_TAGS = (
+    ("Завтрак", "#E26C2D", "breakfast"),
+    ("Обед", "#49B64E", "lunch"),
+    ("Ужин", "#8775D2", "dinner"),
+)
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class ZipfSampler:
+    """
+    Выбор элементов с вероятностью, обратно пропорциональной рангу в
+    степени exponent.
+
+    Ранги назначаются элементам в случайном порядке, поэтому популярность
+    не связана с порядком идентификаторов.
+    """
+
+    def __init__(self, rng, population, exponent):
+        self.rng = rng
+        self.population = list(population)
+        rng.shuffle(self.population)
+        self.cum_weights = list(
+            accumulate(
+                1 / rank**exponent
+                for rank in range(1, len(self.population) + 1)
+            )
+        )
+
+    def sample(self, count, exclude=None):
+        count = min(count, len(self.population) - (exclude is not None))
+        result = set()
+        while len(result) < count:
+            result.update(
+                self.rng.choices(
+                    self.population,
+                    cum_weights=self.cum_weights,
+                    k=count - len(result),
+                )
+            )
+            result.discard(exclude)
+        return sorted(result)
+
+
+class Command(BaseCommand):
+    help = (
+        "Генерация синтетических пользователей, рецептов, избранного, "
+        "списков покупок и подписок для нагрузочного тестирования. "
+        "Ингредиенты берутся из уже загруженного справочника."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--recipes", type=int, default=10000)
+        parser.add_argument(
+            "--favorites",
+            type=int,
+            default=10,
+            help="Среднее число рецептов в избранном у пользователя.",
+        )
+        parser.add_argument(
+            "--shopping-cart",
+            type=int,
+            default=3,
+            help="Среднее число рецептов в списке покупок у пользователя.",
+        )
+        parser.add_argument(
+            "--subscriptions",
+            type=int,
+            default=5,
+            help="Среднее число подписок у пользователя.",
+        )
+        parser.add_argument(
+            "--ingredients",
+            type=int,
+            default=8,
+            help="Максимальное число ингредиентов в рецепте.",
+        )
+        parser.add_argument(
+            "--zipf",
+            type=float,
+            default=1.1,
+            help="Показатель распределения популярности рецептов и авторов.",
+        )
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--prefix",
+            default="load",
+            help="Префикс имен и адресов создаваемых пользователей.",
+        )
+        parser.add_argument(
+            "--password",
+            default="foodgram-load",
+            help="Пароль всех пользователей, хешируется один раз.",
+        )
+        parser.add_argument(
+            "--password-hash",
+            help="Готовый хеш пароля, например из make_password.",
+        )
+        parser.add_argument(
+            "--copy",
+            action="store_true",
+            help="Загружать строки через COPY (только PostgreSQL).",
+        )
+
+    def handle(self, *args, **options):
+        if options["copy"] and connection.vendor != "postgresql":
+            raise CommandError("COPY поддерживается только в PostgreSQL.")
+        ingredient_ids = list(Ingredient.objects.values_list("id", flat=True))
+        if not ingredient_ids:
+            raise CommandError(
+                "Справочник ингредиентов пуст, сначала выполните "
+                "load_ingredients."
+            )
+        prefix = options["prefix"]
+        if CustomUser.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(
+                f"Пользователи с префиксом {prefix!r} уже существуют."
+            )
+
+        self.options = options
+        self.rng = random.Random(options["seed"])
+        self.now = timezone.now()
+        self.started = time.monotonic()
+
+        with transaction.atomic():
+            tag_ids = self.get_tag_ids()
+            user_ids = self.create_users()
+            self.authors = ZipfSampler(self.rng, user_ids, options["zipf"])
+            recipe_ids = self.create_recipes()
+            recipes = ZipfSampler(self.rng, recipe_ids, options["zipf"])
+            ingredients = ZipfSampler(
+                self.rng, ingredient_ids, options["zipf"]
+            )
+
+            self.insert(
+                Recipe.tags.through,
+                ("recipe_id", "tag_id"),
+                (
+                    (recipe_id, tag_id)
+                    for recipe_id in recipe_ids
+                    for tag_id in sorted(
+                        self.rng.sample(
+                            tag_ids, self.rng.randint(1, min(3, len(tag_ids)))
+                        )
+                    )
+                ),
+            )
+            self.insert(
+                RecipeIngredient,
+                ("recipe_id", "ingredient_id", "amount"),
+                (
+                    (recipe_id, ingredient_id, self.rng.randint(1, 500))
+                    for recipe_id in recipe_ids
+                    for ingredient_id in ingredients.sample(
+                        self.rng.randint(1, options["ingredients"])
+                    )
+                ),
+            )
+            for model, average in (
+                (Favorite, options["favorites"]),
+                (ShoppingList, options["shopping_cart"]),
+            ):
+                self.insert(
+                    model,
+                    ("user_id", "recipe_id", "created_at"),
+                    (
+                        (
+                            user_id,
+                            recipe_id,
+                            self.now - ACTIVITY_PERIOD * self.rng.random(),
+                        )
+                        for user_id in user_ids
+                        for recipe_id in recipes.sample(
+                            self.rng.randint(0, 2 * average)
+                        )
+                    ),
+                )
+            self.insert(
+                Subscription,
+                ("subscriber_id", "subscribed_to_id"),
+                (
+                    (user_id, author_id)
+                    for user_id in user_ids
+                    for author_id in self.authors.sample(
+                        self.rng.randint(0, 2 * options["subscriptions"]),
+                        exclude=user_id,
+                    )
+                ),
+            )
+        # Рецепты вставлены в обход API, индексы в памяти строятся заново
+        RecipeChanges.invalidate()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Данные созданы за {time.monotonic() - self.started:.1f} с"
+            )
+        )
+
+    def get_tag_ids(self):
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                Tag(name=name, color=color, slug=slug)
+                for name, color, slug in DEFAULT_TAGS
+            )
+        return list(Tag.objects.order_by("id").values_list("id", flat=True))
+
+    def create_users(self):
+        prefix = self.options["prefix"]
+        password = self.options["password_hash"] or make_password(
+            self.options["password"]
+        )
+        last_id = self.last_id(CustomUser)
+        self.insert(
+            CustomUser,
+            (
+                "username",
+                "email",
+                "first_name",
+                "last_name",
+                "password",
+                "is_superuser",
+                "is_staff",
+                "is_active",
+                "date_joined",
+            ),
+            (
+                (
+                    f"{prefix}{number}",
+                    f"{prefix}{number}@example.com",
+                    self.rng.choice(FIRST_NAMES),
+                    self.rng.choice(LAST_NAMES),
+                    password,
+                    False,
+                    False,
+                    True,
+                    self.now,
+                )
+                for number in range(self.options["users"])
+            ),
+        )
+        return self.new_ids(CustomUser, last_id)
+
+    def create_recipes(self):
+        image = self.placeholder_image()
+        last_id = self.last_id(Recipe)
+        self.insert(
+            Recipe,
+            (
+                "author_id",
+                "name",
+                "image",
+                "text",
+                "cooking_time",
+                "created_at",
+                "popular_score",
+                "trending_score",
+            ),
+            (
+                (
+                    self.authors.sample(1)[0],
+                    f"{self.rng.choice(DISHES)} "
+                    f"{self.rng.choice(ADJECTIVES)} №{number}",
+                    image,
+                    " ".join(
+                        self.rng.choices(ADJECTIVES + DISHES, k=30)
+                    ).capitalize(),
+                    self.rng.randint(5, 180),
+                    # Разные даты нужны ленте и индексам по created_at
+                    self.now - ACTIVITY_PERIOD * self.rng.random(),
+                    0,
+                    0,
+                )
+                for number in range(self.options["recipes"])
+            ),
+        )
+        return self.new_ids(Recipe, last_id)
+
+    # Хранилище изображений адресуется по содержимому, поэтому файл
+    # сохраняется один раз для всех рецептов
+    @staticmethod
+    def placeholder_image():
+        buffer = BytesIO()
+        Image.new("RGB", (640, 480), "#E26C2D").save(buffer, "JPEG")
+        field = Recipe._meta.get_field("image")
+        return field.storage.save(
+            "placeholder.jpg", ContentFile(buffer.getvalue())
+        )
+
+    @staticmethod
+    def last_id(model):
+        return model.objects.order_by("-id").values_list(
+            "id", flat=True
+        ).first() or 0
+
+    @staticmethod
+    def new_ids(model, last_id):
+        return list(
+            model.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+
+    def insert(self, model, fields, rows):
+        """
+        Вставляет строки пачками через bulk_create или COPY.
+
+        :param fields: Имена атрибутов модели в порядке значений строки
+        """
+
+        count = 0
+        batches = batched(rows, self.options["batch_size"])
+        if self.options["copy"]:
+            columns = ", ".join(
+                connection.ops.quote_name(model._meta.get_field(field).column)
+                for field in fields
+            )
+            sql = (
+                f"COPY {connection.ops.quote_name(model._meta.db_table)} "
+                f"({columns}) FROM STDIN WITH (FORMAT csv)"
+            )
+            with connection.cursor() as cursor:
+                for batch in batches:
+                    buffer = StringIO()
+                    csv.writer(buffer).writerows(batch)
+                    buffer.seek(0)
+                    cursor.copy_expert(sql, buffer)
+                    count += len(batch)
+        else:
+            # bulk_create заменяет значения полей auto_now_add временем
+            # вставки, поэтому на время вставки они отключаются
+            auto_now_fields = [
+                field
+                for field in map(model._meta.get_field, fields)
+                if getattr(field, "auto_now_add", False)
+            ]
+            for field in auto_now_fields:
+                field.auto_now_add = False
+            try:
+                for batch in batches:
+                    model.objects.bulk_create(
+                        model(**dict(zip(fields, row))) for row in batch
+                    )
+                    count += len(batch)
+            finally:
+                for field in auto_now_fields:
+                    field.auto_now_add = True
+        self.stdout.write(
+            f"{model._meta.verbose_name_plural}: {count} "
+            f"({time.monotonic() - self.started:.1f} с)"
+        )
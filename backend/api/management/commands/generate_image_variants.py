@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from api.images import generate_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = "Создание уменьшенных копий для уже загруженных изображений."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Пересоздать уже существующие копии.",
+        )
+
+    def handle(self, *args, **options):
+        images = (
+            Recipe.objects.exclude(image="")
+            .order_by("image")
+            .values_list("image", flat=True)
+            .distinct()
+        )
+        processed = failed = 0
+        for name in images.iterator():
+            try:
+                generate_variants(name, force=options["force"])
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f"{name}: {error}")
+                continue
+            processed += 1
+            if processed % 100 == 0:
+                self.stdout.write(f"Обработано изображений: {processed}")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Копии созданы для {processed} изображений, "
+                f"ошибок: {failed}"
+            )
+        )
@@ -1,29 +1,116 @@
 import csv
-import os
+import json
+from itertools import islice
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
 from recipes.models import Ingredient
 
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_PATH = Path(settings.BASE_DIR) / "data" / "ingredients.csv"
+JSON_READ_SIZE = 64 * 1024
 
-file_path = os.path.join(BASE_DIR, "data", "ingredients.csv")
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if len(row) >= 2:
+            yield row[0], row[1]
+
+
+def read_json(file):
+    """
+    Читает JSON-массив объектов по одному элементу, не загружая весь файл.
+    """
+
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    opened = False
+    while True:
+        chunk = file.read(JSON_READ_SIZE)
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position == len(buffer):
+                break
+            if not opened:
+                if buffer[position] != "[":
+                    raise CommandError("Ожидается JSON-массив ингредиентов.")
+                opened = True
+                position += 1
+                continue
+            if buffer[position] == "]":
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise CommandError("Некорректный JSON-файл.")
+                break
+            yield item["name"], item["measurement_unit"]
+        if not chunk:
+            return
+
+
+READERS = {".csv": read_csv, ".json": read_json}
 
 
 class Command(BaseCommand):
-    help = "Загрузка ингредиентов из CSV файла в базу данных."
+    help = (
+        "Загрузка ингредиентов из CSV или JSON файла в базу данных. "
+        "Уже существующие ингредиенты пропускаются, поэтому команду можно "
+        "запускать повторно."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path",
+            nargs="?",
+            default=DEFAULT_PATH,
+            type=Path,
+            help="Путь к файлу ingredients.csv или ingredients.json.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Количество ингредиентов в одном запросе INSERT.",
+        )
 
     def handle(self, *args, **options):
-        with open("data/ingredients.csv", "r") as csvfile:
-            reader = csv.reader(csvfile)
+        path = options["path"]
+        reader = READERS.get(path.suffix.lower())
+        if reader is None:
+            raise CommandError("Поддерживаются только файлы .csv и .json.")
+        if not path.is_file():
+            raise CommandError(f"Файл {path} не найден.")
 
-            for row in reader:
-                name = row[0].strip()
-                measurement_unit = row[1].strip()
-                Ingredient.objects.create(
-                    name=name, measurement_unit=measurement_unit
-                )
+        total = 0
+        with path.open(encoding="utf-8") as file, transaction.atomic():
+            before = Ingredient.objects.count()
+            ingredients = self.unique_ingredients(reader(file))
+            while batch := list(islice(ingredients, options["batch_size"])):
+                Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+                total += len(batch)
+            inserted = Ingredient.objects.count() - before
 
         self.stdout.write(
-            self.style.SUCCESS("Ингредиенты успешно загружены из CSV")
+            self.style.SUCCESS(
+                f"Ингредиенты загружены из {path.name}: добавлено "
+                f"{inserted}, уже были в базе {total - inserted}."
+            )
         )
+
+    # Повторы внутри файла отбрасываются до отправки в базу
+    @staticmethod
+    def unique_ingredients(rows):
+        seen = set()
+        for name, measurement_unit in rows:
+            key = (name.strip(), measurement_unit.strip())
+            if all(key) and key not in seen:
+                seen.add(key)
+                yield Ingredient(name=key[0], measurement_unit=key[1])
@@ -0,0 +1,130 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+MB = 1024 * 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Отчет по памяти из файлов MEMORY_PROFILE_DIR: пиковое выделение и "
+        "места выделения по представлениям, рост RSS процессов."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sort",
+            choices=("peak", "rss"),
+            default="peak",
+            help="Сортировка представлений: по пиковому выделению или RSS.",
+        )
+        parser.add_argument(
+            "--top",
+            type=int,
+            default=5,
+            help="Число мест выделения для каждого представления.",
+        )
+        parser.add_argument(
+            "--rss-threshold",
+            type=float,
+            default=5.0,
+            help="Рост RSS в МБ на 1000 запросов, выше которого процесс "
+            "отмечается как растущий.",
+        )
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Удалить файлы после отчета.",
+        )
+
+    def handle(self, *args, **options):
+        if not settings.MEMORY_PROFILE_DIR:
+            raise CommandError("MEMORY_PROFILE_DIR не задан")
+        paths = sorted(Path(settings.MEMORY_PROFILE_DIR).glob("memory-*.json"))
+        if not paths:
+            raise CommandError("Данных профилирования памяти нет")
+        workers = [json.loads(path.read_text()) for path in paths]
+
+        self.report_routes(workers, options["sort"], options["top"])
+        self.report_workers(workers, options["rss_threshold"])
+        if options["clear"]:
+            for path in paths:
+                path.unlink()
+
+    def report_routes(self, workers, sort, top):
+        routes = {}
+        for worker in workers:
+            for route, stats in worker["routes"].items():
+                total = routes.setdefault(
+                    route,
+                    {
+                        "requests": 0,
+                        "peak_max": 0,
+                        "peak_total": 0,
+                        "rss_growth": 0,
+                        "sites": {},
+                    },
+                )
+                total["requests"] += stats["requests"]
+                total["peak_max"] = max(total["peak_max"], stats["peak_max"])
+                total["peak_total"] += stats["peak_total"]
+                total["rss_growth"] += stats["rss_growth"]
+                for site, size in stats["sites"].items():
+                    total["sites"][site] = max(
+                        total["sites"].get(site, 0), size
+                    )
+
+        key = "peak_max" if sort == "peak" else "rss_growth"
+        self.stdout.write(
+            f"{'Представление':<45} {'запросов':>9} {'пик, МБ':>9} "
+            f"{'средн., МБ':>11} {'RSS, МБ':>9}"
+        )
+        for route, stats in sorted(
+            routes.items(), key=lambda item: item[1][key], reverse=True
+        ):
+            self.stdout.write(
+                f"{route:<45} {stats['requests']:>9} "
+                f"{stats['peak_max'] / MB:>9.2f} "
+                f"{stats['peak_total'] / stats['requests'] / MB:>11.2f} "
+                f"{stats['rss_growth'] / MB:>9.2f}"
+            )
+            for site, size in sorted(
+                stats["sites"].items(), key=lambda item: item[1], reverse=True
+            )[:top]:
+                self.stdout.write(f"    {size / 1024:>10.1f} КБ  {site}")
+
+    def report_workers(self, workers, threshold):
+        self.stdout.write("")
+        for worker in sorted(workers, key=lambda worker: worker["pid"]):
+            points = worker["rss"]
+            first, last = points[0][2], points[-1][2]
+            slope = self.slope(points) * 1000 / MB
+            line = (
+                f"Процесс {worker['pid']}: запросов {worker['requests']}, "
+                f"RSS {first / MB:.1f} -> {last / MB:.1f} МБ, "
+                f"{slope:+.2f} МБ на 1000 запросов"
+            )
+            if slope > threshold:
+                self.stdout.write(self.style.WARNING(f"{line} - растет"))
+            else:
+                self.stdout.write(line)
+
+    # Наклон RSS по числу запросов методом наименьших квадратов
+    @staticmethod
+    def slope(points):
+        if len(points) < 2:
+            return 0.0
+        count = len(points)
+        mean_x = sum(point[1] for point in points) / count
+        mean_y = sum(point[2] for point in points) / count
+        variance = sum((point[1] - mean_x) ** 2 for point in points)
+        if not variance:
+            return 0.0
+        return (
+            sum(
+                (point[1] - mean_x) * (point[2] - mean_y) for point in points
+            )
+            / variance
+        )
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.core.signing import TimestampSigner
+
+from api.profiling import PROFILE_HEADER, PROFILE_SIGNING_SALT
+
+
+class Command(BaseCommand):
+    help = (
+        "Вывод подписанного заголовка, включающего профилирование запроса. "
+        "Заголовок действителен PROFILE_HEADER_MAX_AGE секунд."
+    )
+
+    def handle(self, *args, **options):
+        value = TimestampSigner(salt=PROFILE_SIGNING_SALT).sign("profile")
+        self.stdout.write(f"{PROFILE_HEADER}: {value}")
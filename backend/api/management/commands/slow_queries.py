@@ -0,0 +1,101 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Самые медленные SQL-запросы из журнала SLOW_QUERY_LOG, "
+        "сгруппированные по отпечатку."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sort",
+            choices=("total", "max", "count"),
+            default="total",
+            help="Сортировка: суммарное время, максимум или число запросов.",
+        )
+        parser.add_argument(
+            "--top", type=int, default=10, help="Число отпечатков в отчете."
+        )
+        parser.add_argument(
+            "--route", help="Только запросы представления, например "
+            "RecipeViewSet.list."
+        )
+        parser.add_argument(
+            "--plans",
+            action="store_true",
+            help="Вывести последний сохраненный план каждого отпечатка.",
+        )
+
+    def handle(self, *args, **options):
+        if not settings.SLOW_QUERY_LOG:
+            raise CommandError("SLOW_QUERY_LOG не задан")
+        log = Path(settings.SLOW_QUERY_LOG)
+        # Сначала старые файлы ротации, чтобы последний план был свежим
+        rotated = [
+            path
+            for path in log.parent.glob(f"{log.name}.*")
+            if path.suffix[1:].isdigit()
+        ]
+        paths = sorted(
+            rotated, key=lambda path: int(path.suffix[1:]), reverse=True
+        )
+        if log.exists():
+            paths.append(log)
+        if not paths:
+            raise CommandError("Журнал медленных запросов пуст")
+
+        groups = {}
+        for entry in self.read(paths):
+            if options["route"] and entry["route"] != options["route"]:
+                continue
+            group = groups.setdefault(
+                entry["fingerprint"],
+                {
+                    "sql": entry["sql"],
+                    "count": 0,
+                    "total": 0.0,
+                    "max": 0.0,
+                    "routes": set(),
+                    "plan": None,
+                },
+            )
+            group["count"] += 1
+            group["total"] += entry["duration_ms"]
+            group["max"] = max(group["max"], entry["duration_ms"])
+            group["routes"].add(entry["route"] or entry["path"] or "-")
+            group["plan"] = entry.get("plan") or group["plan"]
+
+        for digest, group in sorted(
+            groups.items(),
+            key=lambda item: item[1][options["sort"]],
+            reverse=True,
+        )[: options["top"]]:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"{digest}  {group['count']} раз, всего "
+                    f"{group['total']:.0f} мс, в среднем "
+                    f"{group['total'] / group['count']:.1f} мс, максимум "
+                    f"{group['max']:.1f} мс"
+                )
+            )
+            self.stdout.write(f"  {', '.join(sorted(group['routes']))}")
+            self.stdout.write(f"  {group['sql']}")
+            if options["plans"] and group["plan"]:
+                for line in group["plan"].splitlines():
+                    self.stdout.write(f"    {line}")
+            self.stdout.write("")
+
+    @staticmethod
+    def read(paths):
+        for path in paths:
+            with open(path, encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
@@ -0,0 +1,145 @@
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from recipes.models import Favorite, Recipe, RecipeRankingState, ShoppingList
+
+# Вклад добавлений старше 20 периодов полураспада меньше миллионной доли
+HISTORY_HALF_LIVES = 20
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчет рейтингов рецептов popular_score и trending_score по "
+        "добавлениям в избранное и список покупок с прошлого запуска. "
+        "Запускается периодически, например из cron раз в несколько минут."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Пересчитать рейтинги всех рецептов.",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        half_life = timedelta(hours=settings.RANKING_HALF_LIFE_HOURS)
+        upper = timezone.now() - timedelta(
+            seconds=settings.RANKING_LAG_SECONDS
+        )
+        weights = (
+            (Favorite, settings.RANKING_FAVORITE_WEIGHT),
+            (ShoppingList, settings.RANKING_SHOPPING_LIST_WEIGHT),
+        )
+
+        # Блокировка состояния не дает двум запускам пересекаться
+        with transaction.atomic():
+            state, _ = (
+                RecipeRankingState.objects.select_for_update().get_or_create(
+                    pk=1
+                )
+            )
+            full = options["full"] or state.processed_until is None
+            if full:
+                since = upper - half_life * HISTORY_HALF_LIVES
+                reference = upper
+                Recipe.objects.filter(
+                    Q(popular_score__gt=0) | Q(trending_score__gt=0)
+                ).update(popular_score=0, trending_score=0)
+            else:
+                since = state.processed_until
+                reference = self.rebase(state.reference, upper, half_life)
+
+            # trending_score хранит сумму весов, умноженных на
+            # 2 ** ((время добавления - reference) / период полураспада).
+            # Затухание всех рецептов на один множитель не меняет порядок,
+            # поэтому обновляются только рецепты с новыми добавлениями
+            trending = defaultdict(float)
+            for model, weight in weights:
+                events = (
+                    model.objects.filter(
+                        created_at__gt=since, created_at__lte=upper
+                    )
+                    .values_list("recipe_id", "created_at")
+                    .iterator(chunk_size=settings.RANKING_CHUNK_SIZE)
+                )
+                for recipe_id, created_at in events:
+                    trending[recipe_id] += weight * 2 ** (
+                        (created_at - reference) / half_life
+                    )
+
+            recipe_ids = set(trending)
+            if full:
+                for model, _ in weights:
+                    recipe_ids.update(
+                        model.objects.values_list(
+                            "recipe_id", flat=True
+                        ).distinct()
+                    )
+            recipe_ids = sorted(recipe_ids)
+            for start in range(
+                0, len(recipe_ids), settings.RANKING_CHUNK_SIZE
+            ):
+                self.update_batch(
+                    recipe_ids[start:start + settings.RANKING_CHUNK_SIZE],
+                    trending,
+                    weights,
+                )
+
+            state.processed_until = upper
+            state.reference = reference
+            state.save()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Рейтинги обновлены для {len(recipe_ids)} рецептов за "
+                f"{time.perf_counter() - started:.1f} с"
+            )
+        )
+
+    # Точка отсчета переносится, пока множители не вышли за пределы float
+    @staticmethod
+    def rebase(reference, upper, half_life):
+        if upper - reference <= half_life * settings.RANKING_REBASE_HALF_LIVES:
+            return reference
+        Recipe.objects.filter(trending_score__gt=0).update(
+            trending_score=F("trending_score")
+            * 2 ** ((reference - upper) / half_life)
+        )
+        return upper
+
+    # Популярность пересчитывается по текущему числу добавлений, поэтому
+    # удаления из избранного учитываются при следующем добавлении рецепта
+    # или полном пересчете
+    @staticmethod
+    def update_batch(recipe_ids, trending, weights):
+        popular = Counter()
+        for model, weight in weights:
+            counts = (
+                model.objects.filter(recipe_id__in=recipe_ids)
+                .values("recipe_id")
+                .annotate(count=Count("id"))
+                .order_by()
+                .values_list("recipe_id", "count")
+            )
+            for recipe_id, count in counts:
+                popular[recipe_id] += weight * count
+
+        recipes = list(
+            Recipe.objects.filter(id__in=recipe_ids).only(
+                "id", "trending_score"
+            )
+        )
+        for recipe in recipes:
+            recipe.popular_score = popular[recipe.id]
+            recipe.trending_score += trending.get(recipe.id, 0)
+        Recipe.objects.bulk_update(
+            recipes, ["popular_score", "trending_score"]
+        )
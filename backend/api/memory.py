@@ -0,0 +1,101 @@
+import json
+import os
+import resource
+import time
+from pathlib import Path
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def current_rss():
+    """
+    Возвращает текущий размер резидентной памяти процесса в байтах.
+
+    Без /proc возвращается максимальный RSS за время жизни процесса.
+    """
+
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class MemoryProfile:
+    """
+    Статистика памяти по представлениям в текущем процессе
+
+    Для каждого представления и действия хранятся пиковый объем выделенной
+    за запрос памяти, рост RSS после запросов и основные места выделения,
+    а для процесса - история RSS. Данные периодически записываются в
+    файл memory-<pid>.json, который читает команда memory_report.
+    """
+
+    def __init__(self, directory, flush_interval, top_sites):
+        self.directory = Path(directory)
+        self.flush_interval = flush_interval
+        self.top_sites = top_sites
+        self.pid = os.getpid()
+        self.started = int(time.time())
+        self.requests = 0
+        self.routes = {}
+        self.rss = [(self.started, 0, current_rss())]
+        self.flushed = time.monotonic()
+
+    def record(self, route, peak, rss_growth, sites=None):
+        """
+        Учитывает один запрос.
+
+        :param peak: Пиковый объем памяти, выделенной за запрос, в байтах
+        :param rss_growth: Изменение RSS процесса за запрос в байтах
+        :param sites: Пары (место выделения, байт) из сравнения снимков
+        """
+
+        stats = self.routes.setdefault(
+            route,
+            {
+                "requests": 0,
+                "peak_max": 0,
+                "peak_total": 0,
+                "rss_growth": 0,
+                "sites": {},
+            },
+        )
+        stats["requests"] += 1
+        stats["peak_max"] = max(stats["peak_max"], peak)
+        stats["peak_total"] += peak
+        stats["rss_growth"] += max(rss_growth, 0)
+        for site, size in sites or ():
+            stats["sites"][site] = max(stats["sites"].get(site, 0), size)
+
+        self.requests += 1
+        if time.monotonic() - self.flushed >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self.flushed = time.monotonic()
+        self.rss.append((int(time.time()), self.requests, current_rss()))
+        for stats in self.routes.values():
+            stats["sites"] = dict(
+                sorted(
+                    stats["sites"].items(),
+                    key=lambda item: item[1],
+                    reverse=True,
+                )[: self.top_sites]
+            )
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"memory-{self.pid}.json"
+        temporary = path.with_suffix(".tmp")
+        temporary.write_text(
+            json.dumps(
+                {
+                    "pid": self.pid,
+                    "started": self.started,
+                    "requests": self.requests,
+                    "routes": self.routes,
+                    "rss": self.rss,
+                }
+            )
+        )
+        os.replace(temporary, path)
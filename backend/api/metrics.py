@@ -0,0 +1,87 @@
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+LABELS = ("view", "action")
+
+# Произвольные методы запроса не должны создавать новые серии метрик
+HTTP_METHODS = frozenset(
+    ("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS", "TRACE")
+)
+
+REQUESTS = Counter(
+    "foodgram_requests",
+    "Число запросов по представлению, действию и статусу ответа",
+    LABELS + ("method", "status"),
+)
+REQUEST_DURATION = Histogram(
+    "foodgram_request_duration_seconds",
+    "Время обработки запроса",
+    LABELS,
+    buckets=(
+        0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1, 2.5, 5, 10,
+    ),
+)
+REQUEST_DB_DURATION = Histogram(
+    "foodgram_request_db_duration_seconds",
+    "Суммарное время SQL-запросов за запрос",
+    LABELS,
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+REQUEST_QUERIES = Histogram(
+    "foodgram_request_queries",
+    "Число SQL-запросов за запрос",
+    LABELS,
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144),
+)
+RESPONSE_SIZE = Histogram(
+    "foodgram_response_size_bytes",
+    "Размер тела ответа",
+    LABELS,
+    buckets=(
+        256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216,
+    ),
+)
+
+
+def record_request(metrics):
+    """
+    Учитывает показатели запроса RequestMetrics в метриках.
+    """
+
+    method = metrics.method
+    action = metrics.action or "none"
+    # Для неизвестного метода действие совпадает с его именем
+    if method not in HTTP_METHODS:
+        method = action = "other"
+    labels = {"view": metrics.view or "unresolved", "action": action}
+    REQUESTS.labels(
+        method=method, status=str(metrics.status), **labels
+    ).inc()
+    REQUEST_DURATION.labels(**labels).observe(metrics.total_time)
+    REQUEST_DB_DURATION.labels(**labels).observe(metrics.db_time)
+    REQUEST_QUERIES.labels(**labels).observe(metrics.queries)
+    if metrics.size is not None:
+        RESPONSE_SIZE.labels(**labels).observe(metrics.size)
+
+
+def render_metrics():
+    """
+    Возвращает метрики в текстовом формате Prometheus и его content type.
+
+    Если задан PROMETHEUS_MULTIPROC_DIR, значения суммируются по файлам
+    всех процессов gunicorn, иначе берутся из текущего процесса.
+    """
+
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,239 @@
+import atexit
+import json
+import logging
+import random
+import threading
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.signing import BadSignature, TimestampSigner
+from django.db import connection
+
+from api.instrumentation import RequestMetrics, current_metrics
+from api.memory import MemoryProfile, current_rss
+from api.n_plus_one import NPlusOneDetector
+from api.profiling import (
+    PROFILE_HEADER,
+    PROFILE_SIGNING_SALT,
+    SamplingProfiler,
+)
+from api.slow_queries import SlowQueryLog
+
+logger = logging.getLogger("api.requests")
+
+
+class RequestInstrumentationMiddleware:
+    """
+    Сбор показателей каждого запроса
+
+    При REQUEST_INSTRUMENTATION пишет в лог строку JSON с представлением,
+    действием, числом и временем SQL-запросов, временем отрисовки и общим
+    временем. При SERVER_TIMING также учитывает время сериализации и
+    добавляет к ответу заголовок Server-Timing, при METRICS_ENABLED
+    учитывает показатели в метриках Prometheus. Настройки независимы,
+    без всех трех middleware отключается. Должен стоять первым в
+    MIDDLEWARE, чтобы учитывать время остальных обработчиков.
+    """
+
+    def __init__(self, get_response):
+        if not (
+            settings.REQUEST_INSTRUMENTATION
+            or settings.SERVER_TIMING
+            or settings.METRICS_ENABLED
+        ):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.record_request = None
+        if settings.METRICS_ENABLED:
+            from api.metrics import record_request
+
+            self.record_request = record_request
+
+    def __call__(self, request):
+        metrics = RequestMetrics(request)
+        token = current_metrics.set(metrics)
+        try:
+            with connection.execute_wrapper(metrics.execute_wrapper):
+                response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+
+        metrics.finish(response)
+        if settings.SERVER_TIMING:
+            response["Server-Timing"] = metrics.server_timing()
+        if settings.REQUEST_INSTRUMENTATION:
+            logger.info(json.dumps(metrics.as_dict(), ensure_ascii=False))
+        if self.record_request is not None:
+            self.record_request(metrics)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = current_metrics.get()
+        if metrics is not None:
+            metrics.set_view(view_func, request.method)
+
+    # Ответы DRF отрисовываются после всех process_template_response
+    def process_template_response(self, request, response):
+        metrics = current_metrics.get()
+        if metrics is not None:
+            metrics.render_started = time.perf_counter()
+        return response
+
+
+class SlowQueryLogMiddleware:
+    """
+    Журнал медленных SQL-запросов
+
+    Запросы дольше SLOW_QUERY_THRESHOLD_MS пишутся в лог api.slow_queries
+    с представлением и действием, для доли SLOW_QUERY_EXPLAIN_RATE из них
+    на PostgreSQL сохраняется план выполнения. Отчет по журналу выводит
+    команда slow_queries. Без SLOW_QUERY_LOG middleware отключается.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SLOW_QUERY_LOG:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        wrapper = SlowQueryLog(
+            settings.SLOW_QUERY_THRESHOLD_MS,
+            settings.SLOW_QUERY_EXPLAIN_RATE,
+            request.path,
+        )
+        with connection.execute_wrapper(wrapper):
+            return self.get_response(request)
+
+
+class NPlusOneMiddleware:
+    """
+    Поиск N+1 при разработке и на тестовом стенде
+
+    Одинаковые SQL-запросы из одного места кода, выполненные в запросе
+    больше NPLUSONE_THRESHOLD раз, выводятся в лог api.n_plus_one или,
+    при NPLUSONE_MODE=raise, прерывают запрос исключением NPlusOneError.
+    Без NPLUSONE_MODE middleware отключается.
+    """
+
+    def __init__(self, get_response):
+        if not settings.NPLUSONE_MODE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        detector = NPlusOneDetector(
+            settings.NPLUSONE_THRESHOLD, settings.NPLUSONE_MODE, request.path
+        )
+        with connection.execute_wrapper(detector):
+            response = self.get_response(request)
+        detector.report()
+        return response
+
+
+class RequestProfilingMiddleware:
+    """
+    Профилирование отдельных запросов
+
+    Профилируется запрос с заголовком X-Profile, подписанным командой
+    profile_header, и доля PROFILE_SAMPLE_RATE случайных запросов.
+    Профиль сохраняется в PROFILE_DIR, имя файла возвращается в заголовке
+    X-Profile-File. Без PROFILE_DIR middleware отключается.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILE_DIR:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.signer = TimestampSigner(salt=PROFILE_SIGNING_SALT)
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        profiler = SamplingProfiler(
+            threading.get_ident(), settings.PROFILE_INTERVAL_MS / 1000
+        )
+        profiler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.stop()
+
+        metrics = current_metrics.get()
+        label = metrics.route if metrics is not None else "request"
+        response["X-Profile-File"] = profiler.save(
+            settings.PROFILE_DIR, label
+        )
+        return response
+
+    def should_profile(self, request):
+        value = request.headers.get(PROFILE_HEADER)
+        if value:
+            try:
+                self.signer.unsign(
+                    value, max_age=settings.PROFILE_HEADER_MAX_AGE
+                )
+            except BadSignature:
+                return False
+            return True
+        rate = settings.PROFILE_SAMPLE_RATE
+        return rate > 0 and random.random() < rate
+
+
+class MemoryProfilingMiddleware:
+    """
+    Профилирование памяти по представлениям
+
+    Для каждого запроса учитываются пиковый объем выделенной памяти по
+    tracemalloc и рост RSS процесса, для доли MEMORY_SNAPSHOT_RATE
+    запросов - основные места выделения по сравнению снимков. Пиковые
+    значения точны для синхронных процессов gunicorn, где запросы не
+    выполняются параллельно. Без MEMORY_PROFILE_DIR middleware отключается.
+    """
+
+    def __init__(self, get_response):
+        if not settings.MEMORY_PROFILE_DIR:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(settings.MEMORY_TRACE_FRAMES)
+        self.profile = MemoryProfile(
+            settings.MEMORY_PROFILE_DIR,
+            settings.MEMORY_FLUSH_INTERVAL,
+            settings.MEMORY_TOP_SITES,
+        )
+        # Данные последних запросов записываются при остановке процесса
+        atexit.register(self.profile.flush)
+        self.filters = (tracemalloc.Filter(False, tracemalloc.__file__),)
+
+    def __call__(self, request):
+        before = None
+        if random.random() < settings.MEMORY_SNAPSHOT_RATE:
+            before = tracemalloc.take_snapshot().filter_traces(self.filters)
+        rss = current_rss()
+        tracemalloc.reset_peak()
+        allocated = tracemalloc.get_traced_memory()[0]
+
+        response = self.get_response(request)
+
+        peak = tracemalloc.get_traced_memory()[1] - allocated
+        sites = None
+        if before is not None:
+            after = tracemalloc.take_snapshot().filter_traces(self.filters)
+            sites = [
+                (str(stat.traceback), stat.size_diff)
+                for stat in after.compare_to(before, "lineno")[
+                    : settings.MEMORY_TOP_SITES
+                ]
+                if stat.size_diff > 0
+            ]
+        metrics = current_metrics.get()
+        self.profile.record(
+            metrics.route if metrics is not None else request.path,
+            peak,
+            current_rss() - rss,
+            sites,
+        )
+        return response
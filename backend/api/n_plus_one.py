@@ -0,0 +1,110 @@
+import logging
+import sys
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from rest_framework.fields import Field, SerializerMethodField
+
+from api.slow_queries import fingerprint
+
+logger = logging.getLogger("api.n_plus_one")
+
+# Кадры этих модулей не считаются местом вызова запроса
+SKIPPED_MODULES = ("api.n_plus_one", "api.instrumentation", "api.middleware")
+
+
+class NPlusOneError(Exception):
+    pass
+
+
+class NPlusOneDetector:
+    """
+    Поиск повторяющихся запросов в пределах одного запроса к API
+
+    Обертка для connection.execute_wrapper группирует SQL-запросы по
+    нормализованному тексту, месту вызова в коде проекта и полю
+    сериализатора, при обработке которого выполнен запрос. Группа, в
+    которой больше threshold запросов, считается N+1: в режиме raise
+    сразу выбрасывается NPlusOneError, в режиме warn группы выводятся в
+    лог api.n_plus_one после ответа.
+    """
+
+    def __init__(self, threshold, mode, path=None):
+        self.threshold = threshold
+        self.mode = mode
+        self.path = path
+        self.groups = Counter()
+        self.examples = {}
+        self.root = str(Path(settings.BASE_DIR).resolve())
+
+    def __call__(self, execute, sql, params, many, context):
+        normalized, _ = fingerprint(sql)
+        key = (normalized,) + self.origin(sys._getframe(1))
+        self.groups[key] += 1
+        if self.groups[key] > self.threshold and self.mode == "raise":
+            raise NPlusOneError(self.describe(key, self.groups[key]))
+        return execute(sql, params, many, context)
+
+    def origin(self, frame):
+        """
+        Возвращает место вызова в коде проекта и поле сериализатора.
+
+        Полем считается ближайший SerializerMethodField или поле,
+        получающее значение атрибута, например связанные объекты без
+        prefetch_related.
+        """
+
+        call_site = field = None
+        while frame is not None and (call_site is None or field is None):
+            code = frame.f_code
+            if (
+                call_site is None
+                and code.co_filename.startswith(self.root)
+                and frame.f_globals.get("__name__") not in SKIPPED_MODULES
+            ):
+                call_site = (
+                    f"{frame.f_globals.get('__name__')}:{frame.f_lineno} "
+                    f"in {code.co_name}"
+                )
+            if field is None:
+                field = self.serializer_field(frame)
+            frame = frame.f_back
+        return call_site or "?", field or "?"
+
+    @staticmethod
+    def serializer_field(frame):
+        instance = frame.f_locals.get("self")
+        if not isinstance(instance, Field) or instance.parent is None:
+            return None
+        name = frame.f_code.co_name
+        if (
+            isinstance(instance, SerializerMethodField)
+            and name == "to_representation"
+        ):
+            return f"{type(instance.parent).__name__}.{instance.method_name}"
+        # Вложенный сериализатор с many=True читает связь в to_representation
+        if instance.field_name and name in (
+            "get_attribute",
+            "to_representation",
+        ):
+            return f"{type(instance.parent).__name__}.{instance.field_name}"
+        return None
+
+    def duplicates(self):
+        return [
+            (key, count)
+            for key, count in self.groups.most_common()
+            if count > self.threshold
+        ]
+
+    def describe(self, key, count):
+        sql, call_site, field = key
+        return (
+            f"N+1 в {self.path}: {count} одинаковых запросов, поле {field}, "
+            f"вызов {call_site}: {sql[:300]}"
+        )
+
+    def report(self):
+        for key, count in self.duplicates():
+            logger.warning(self.describe(key, count))
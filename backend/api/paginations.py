@@ -1,6 +1,12 @@
+import base64
+import json
+
 from django.conf import settings
+from django.db.models import F, Q
 
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
 
 
 class CustomPagination(PageNumberPagination):
@@ -13,3 +19,81 @@ class CustomPagination(PageNumberPagination):
 
     page_size = getattr(settings, "PAGE_SIZE", 6)
     page_size_query_param = "limit"
+
+
+class KeysetPagination(BasePagination):
+    """
+    Постраничный вывод по ключу для сортировки по убыванию поля
+
+    Выборка сортируется по (field, id) по убыванию, курсор следующей
+    страницы содержит значения последнего объекта. Страница выбирается
+    по индексу (field, id) без OFFSET и подсчета общего числа объектов,
+    поэтому дальние страницы не дороже первой.
+    """
+
+    page_size = CustomPagination.page_size
+    page_size_query_param = CustomPagination.page_size_query_param
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Неверный курсор."
+
+    def __init__(self, field):
+        self.field = field
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        size = self.get_page_size(request)
+        queryset = self.page_queryset(queryset, self.decode_cursor(request))
+        page = list(queryset[: size + 1])
+        self.next_cursor = None
+        if len(page) > size:
+            page = page[:size]
+            self.next_cursor = (page[-1].keyset_value, page[-1].id)
+        return page
+
+    def page_queryset(self, queryset, cursor=None):
+        """
+        Возвращает выборку, начинающуюся после курсора (значение, id).
+        """
+
+        queryset = queryset.annotate(keyset_value=F(self.field)).order_by(
+            f"-{self.field}", "-id"
+        )
+        if cursor is None:
+            return queryset
+        value, pk = cursor
+        # Условие field <= value задает начало просмотра индекса
+        return queryset.filter(
+            Q(**{f"{self.field}__lt": value}) | Q(id__lt=pk),
+            **{f"{self.field}__lte": value},
+        )
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return size if size > 0 else self.page_size
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            value, pk = json.loads(base64.urlsafe_b64decode(encoded))
+            return float(value), int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        params = self.request.query_params.copy()
+        params[self.cursor_query_param] = base64.urlsafe_b64encode(
+            json.dumps(self.next_cursor).encode()
+        ).decode()
+        return self.request.build_absolute_uri(
+            f"{self.request.path}?{params.urlencode()}"
+        )
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
@@ -0,0 +1,70 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_SIGNING_SALT = "api.profiling"
+
+
+class SamplingProfiler:
+    """
+    Статистический профилировщик одного потока
+
+    Отдельный поток с заданным интервалом снимает стек профилируемого
+    потока через sys._current_frames. Результат сохраняется в формате
+    collapsed stacks, который понимают flamegraph.pl и speedscope.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="request-profiler", daemon=True
+        )
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[self.collapse(frame)] += 1
+                self.samples += 1
+
+    @staticmethod
+    def collapse(frame):
+        names = []
+        while frame is not None:
+            module = frame.f_globals.get("__name__", "?")
+            names.append(f"{module}:{frame.f_code.co_name}")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def save(self, directory, label):
+        """
+        Записывает профиль в каталог и возвращает имя файла.
+        """
+
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        name = (
+            f"{time.strftime('%Y%m%d-%H%M%S')}-{label}-{os.getpid()}-"
+            f"{self.duration * 1000:.0f}ms.collapsed"
+        )
+        with open(directory / name, "w") as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+        return name
@@ -0,0 +1,62 @@
+from django.db import connection
+from django.db.backends.utils import CursorDebugWrapper
+
+
+class RowCountingCursor(CursorDebugWrapper):
+    """
+    Курсор, считающий выполненные запросы и полученные строки.
+    """
+
+    def __init__(self, cursor, db, stats):
+        super().__init__(cursor, db)
+        self.stats = stats
+
+    def execute(self, sql, params=None):
+        self.stats.queries += 1
+        return super().execute(sql, params)
+
+    def executemany(self, sql, param_list):
+        self.stats.queries += 1
+        return super().executemany(sql, param_list)
+
+    def fetchone(self):
+        row = self.cursor.fetchone()
+        if row is not None:
+            self.stats.rows += 1
+        return row
+
+    def fetchmany(self, *args):
+        rows = self.cursor.fetchmany(*args)
+        self.stats.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self.cursor.fetchall()
+        self.stats.rows += len(rows)
+        return rows
+
+    def __iter__(self):
+        for row in self.cursor:
+            self.stats.rows += 1
+            yield row
+
+
+class QueryStats:
+    """
+    Контекстный менеджер, считающий запросы и полученные строки.
+    """
+
+    def __init__(self):
+        self.queries = self.rows = 0
+
+    def __enter__(self):
+        self.force_debug_cursor = connection.force_debug_cursor
+        connection.force_debug_cursor = True
+        connection.make_debug_cursor = lambda cursor: RowCountingCursor(
+            cursor, connection, self
+        )
+        return self
+
+    def __exit__(self, *exc_info):
+        del connection.make_debug_cursor
+        connection.force_debug_cursor = self.force_debug_cursor
@@ -0,0 +1,535 @@
+import logging
+import math
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from heapq import nlargest
+from itertools import combinations, groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import Max
+
+from recipes.models import Recipe, RecipeIngredient
+
+CHANGES_VERSION_KEY = "recipe_index:version"
+CHANGE_KEY = "recipe_index:change:{}"
+
+logger = logging.getLogger(__name__)
+
+
+def grow(values, length):
+    """
+    Дополняет массив нулями до длины length.
+    """
+
+    if len(values) < length:
+        values.extend(array(values.typecode, [0]) * (length - len(values)))
+
+
+def contains(values, value):
+    position = bisect_left(values, value)
+    return position < len(values) and values[position] == value
+
+
+class RecipeChanges:
+    """
+    Журнал изменений состава рецептов в общем кеше
+
+    Каждое изменение получает номер версии, по которому процессы gunicorn
+    дополняют свои индексы в памяти. Если часть журнала вытеснена из кеша,
+    индекс строится заново.
+    """
+
+    @staticmethod
+    def record(recipe_id, old_ingredients, new_ingredients):
+        """
+        Записывает изменение после фиксации транзакции.
+
+        :param recipe_id: Идентификатор рецепта
+        :param old_ingredients: Идентификаторы ингредиентов до изменения
+        :param new_ingredients: Идентификаторы ингредиентов после изменения,
+                                пустые для удаленного рецепта
+        """
+
+        change = (recipe_id, tuple(old_ingredients), tuple(new_ingredients))
+        transaction.on_commit(lambda: RecipeChanges.publish(change))
+
+    @staticmethod
+    def publish(change):
+        cache.add(CHANGES_VERSION_KEY, 0, None)
+        version = cache.incr(CHANGES_VERSION_KEY)
+        cache.set(
+            CHANGE_KEY.format(version),
+            change,
+            settings.RECIPE_INDEX_CHANGES_TIMEOUT,
+        )
+
+    @staticmethod
+    def invalidate():
+        """
+        Заставляет все процессы построить индексы заново.
+
+        Используется после массовой загрузки рецептов в обход API.
+        """
+
+        cache.add(CHANGES_VERSION_KEY, 0, None)
+        cache.incr(CHANGES_VERSION_KEY)
+
+    @staticmethod
+    def current_version():
+        return cache.get(CHANGES_VERSION_KEY, 0)
+
+    @staticmethod
+    def since(version, current):
+        """
+        Возвращает изменения после версии или None, если журнал неполон.
+        """
+
+        keys = [
+            CHANGE_KEY.format(number)
+            for number in range(version + 1, current + 1)
+        ]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            return None
+        return [changes[key] for key in keys]
+
+
+class RecipeIndex:
+    """
+    Базовый класс индекса рецептов в памяти процесса
+
+    Индекс строится из RecipeIngredient при запуске процесса gunicorn
+    (warm_up) или при первом обращении, затем дополняется изменениями из
+    RecipeChanges. Если журнал неполон, изменений слишком много или индекс
+    старше RECIPE_INDEX_MAX_AGE секунд, новый индекс строится в фоновом
+    потоке, а запросы до его готовности обслуживает прежний.
+    """
+
+    # Атрибуты с данными, которые переносятся из построенного индекса
+    fields = ()
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        # Не RLock: блокировку освобождает фоновый поток построения
+        self.build_lock = threading.Lock()
+        self.version = None
+        self.built_at = 0.0
+
+    def reset(self):
+        with self.lock:
+            self.version = None
+
+    def refresh(self):
+        with self.build_lock:
+            self.rebuild(RecipeChanges.current_version())
+
+    def ensure_fresh(self):
+        if self.version is None:
+            with self.build_lock:
+                if self.version is None:
+                    self.rebuild(RecipeChanges.current_version())
+            return
+        with self.lock:
+            current = RecipeChanges.current_version()
+            if (
+                current < self.version
+                or time.monotonic() - self.built_at
+                > settings.RECIPE_INDEX_MAX_AGE
+                or current - self.version > settings.RECIPE_INDEX_MAX_CHANGES
+            ):
+                self.refresh_in_background(current)
+                return
+            if current == self.version:
+                return
+            changes = RecipeChanges.since(self.version, current)
+            if changes is None:
+                self.refresh_in_background(current)
+                return
+            for recipe_id, old_ingredients, new_ingredients in changes:
+                self.apply(recipe_id, old_ingredients, new_ingredients)
+            self.version = current
+
+    # Версия журнала читается до построения, и изменения, зафиксированные
+    # во время построения, применяются к индексу, где они уже могут быть.
+    # Поэтому apply приводит рецепт к новому составу, а прежний состав
+    # берет из индекса, а не из журнала
+    def rebuild(self, version):
+        """
+        Строит новый индекс и заменяет им данные текущего.
+
+        :param version: Версия журнала, прочитанная до построения
+        """
+
+        index = type(self)()
+        index.build()
+        with self.lock:
+            for field in self.fields:
+                setattr(self, field, getattr(index, field))
+            self.version = version
+            self.built_at = time.monotonic()
+
+    def refresh_in_background(self, version):
+        if not self.build_lock.acquire(blocking=False):
+            return
+        try:
+            threading.Thread(
+                target=self.rebuild_in_background, args=(version,), daemon=True
+            ).start()
+        except BaseException:
+            self.build_lock.release()
+            raise
+
+    def rebuild_in_background(self, version):
+        try:
+            self.rebuild(version)
+        except Exception:
+            logger.exception("Не удалось построить %s", type(self).__name__)
+        finally:
+            self.build_lock.release()
+            connections.close_all()
+
+    @staticmethod
+    def rows():
+        """
+        Возвращает пары (recipe_id, ingredient_id) по возрастанию.
+        """
+
+        fields = ("recipe_id", "ingredient_id")
+        return (
+            RecipeIngredient.objects.order_by(*fields)
+            .values_list(*fields)
+            .iterator(chunk_size=settings.RECIPE_INDEX_CHUNK_SIZE)
+        )
+
+    def build(self):
+        raise NotImplementedError
+
+    def apply(self, recipe_id, old_ingredients, new_ingredients):
+        raise NotImplementedError
+
+
+class IngredientIndex(RecipeIndex):
+    """
+    Обратный индекс ингредиент -> рецепты для поиска по продуктам
+
+    Для каждого ингредиента хранится отсортированный массив идентификаторов
+    рецептов, для каждого рецепта - отсортированный массив ингредиентов и
+    их число в массиве, индексированном идентификатором рецепта.
+    """
+
+    fields = ("postings", "ingredients", "sizes", "recipe_count")
+
+    def __init__(self):
+        super().__init__()
+        self.postings = {}
+        self.ingredients = {}
+        self.sizes = array("H")
+        self.recipe_count = 0
+
+    # Строки идут по возрастанию рецептов, поэтому массивы рецептов
+    # ингредиентов получаются отсортированными
+    def build(self):
+        max_id = Recipe.objects.aggregate(max_id=Max("id"))["max_id"] or 0
+        self.sizes = array("H", [0]) * (max_id + 1)
+        for recipe_id, rows in groupby(self.rows(), itemgetter(0)):
+            self.add_recipe(recipe_id, [row[1] for row in rows])
+
+    def add_recipe(self, recipe_id, ingredient_ids):
+        for ingredient_id in ingredient_ids:
+            recipes = self.postings.get(ingredient_id)
+            if recipes is None:
+                recipes = self.postings[ingredient_id] = array("i")
+            recipes.append(recipe_id)
+        self.ingredients[recipe_id] = array("i", ingredient_ids)
+        grow(self.sizes, recipe_id + 1)
+        self.sizes[recipe_id] = len(ingredient_ids)
+        self.recipe_count += 1
+
+    def apply(self, recipe_id, old_ingredients, new_ingredients):
+        current = set(self.ingredients.pop(recipe_id, ()))
+        new_ingredients = set(new_ingredients)
+        for ingredient_id in current - new_ingredients:
+            recipes = self.postings[ingredient_id]
+            del recipes[bisect_left(recipes, recipe_id)]
+        for ingredient_id in new_ingredients - current:
+            recipes = self.postings.setdefault(ingredient_id, array("i"))
+            recipes.insert(bisect_left(recipes, recipe_id), recipe_id)
+        if new_ingredients:
+            self.ingredients[recipe_id] = array("i", sorted(new_ingredients))
+        grow(self.sizes, recipe_id + 1)
+        self.sizes[recipe_id] = len(new_ingredients)
+        self.recipe_count += bool(new_ingredients) - bool(current)
+
+    def search(self, ingredient_ids, min_coverage, limit):
+        """
+        Возвращает рецепты, для которых есть доля ингредиентов min_coverage.
+
+        :param ingredient_ids: Идентификаторы имеющихся ингредиентов
+        :param min_coverage: Минимальная доля имеющихся ингредиентов
+        :param limit: Максимальное число рецептов в результате
+        :return: Тройки (recipe_id, покрытие, число недостающих) по
+                 убыванию покрытия, затем числа совпавших ингредиентов
+        """
+
+        self.ensure_fresh()
+        with self.lock:
+            # Counter.update считает элементы массивов в C без цикла Python
+            matches = Counter()
+            for ingredient_id in set(ingredient_ids):
+                recipes = self.postings.get(ingredient_id)
+                if recipes:
+                    matches.update(recipes)
+            sizes = self.sizes
+            candidates = (
+                (matched / sizes[recipe_id], matched, recipe_id)
+                for recipe_id, matched in matches.items()
+                if matched >= min_coverage * sizes[recipe_id]
+            )
+            return [
+                (recipe_id, coverage, sizes[recipe_id] - matched)
+                for coverage, matched, recipe_id in nlargest(
+                    limit, candidates
+                )
+            ]
+
+
+class SimilarityIndex(IngredientIndex):
+    """
+    Обратный индекс с весами IDF для поиска похожих рецептов
+
+    Рецепт представлен множеством ингредиентов с весом
+    idf = ln((1 + N) / (1 + df)) + 1, поэтому соль и вода почти не влияют
+    на сходство. Для каждого рецепта хранятся сумма весов и сумма их
+    квадратов, сходство считается косинусным или взвешенным коэффициентом
+    Жаккара по пересечению через списки рецептов ингредиентов.
+    """
+
+    fields = IngredientIndex.fields + ("weights", "squares")
+
+    def __init__(self):
+        super().__init__()
+        self.weights = array("d")
+        self.squares = array("d")
+
+    def idf(self, ingredient_id):
+        recipes = self.postings.get(ingredient_id)
+        frequency = len(recipes) if recipes else 0
+        return math.log((1 + self.recipe_count) / (1 + frequency)) + 1
+
+    def build(self):
+        super().build()
+        weights = array("d", [0]) * len(self.sizes)
+        squares = array("d", [0]) * len(self.sizes)
+        for ingredient_id, recipes in self.postings.items():
+            weight = self.idf(ingredient_id)
+            square = weight * weight
+            for recipe_id in recipes:
+                weights[recipe_id] += weight
+                squares[recipe_id] += square
+        self.weights = weights
+        self.squares = squares
+
+    # Веса остальных рецептов уточняются при следующем построении
+    def apply(self, recipe_id, old_ingredients, new_ingredients):
+        new_ingredients = set(new_ingredients)
+        super().apply(recipe_id, old_ingredients, new_ingredients)
+        grow(self.weights, len(self.sizes))
+        grow(self.squares, len(self.sizes))
+        weights = [
+            self.idf(ingredient_id) for ingredient_id in new_ingredients
+        ]
+        self.weights[recipe_id] = sum(weights)
+        self.squares[recipe_id] = sum(weight * weight for weight in weights)
+
+    def similar(self, recipe_id, ingredient_ids, limit, metric="cosine"):
+        """
+        Возвращает рецепты, похожие на рецепт с заданными ингредиентами.
+
+        :param recipe_id: Идентификатор рецепта, исключается из результата
+        :param ingredient_ids: Идентификаторы ингредиентов рецепта
+        :param limit: Число похожих рецептов
+        :param metric: cosine или jaccard
+        :return: Пары (recipe_id, сходство) по убыванию сходства
+        """
+
+        self.ensure_fresh()
+        with self.lock:
+            return self.score(recipe_id, ingredient_ids, limit, metric)
+
+    def score(self, recipe_id, ingredient_ids, limit, metric="cosine"):
+        weights = sorted(
+            (
+                (self.idf(ingredient_id), ingredient_id)
+                for ingredient_id in set(ingredient_ids)
+                if self.postings.get(ingredient_id)
+            ),
+            reverse=True,
+        )
+        scores = {}
+        # Редкие ингредиенты с большим весом определяют кандидатов, для
+        # частых вес добавляется только уже найденным кандидатам
+        for weight, ingredient_id in weights:
+            recipes = self.postings[ingredient_id]
+            if metric == "cosine":
+                weight *= weight
+            if len(recipes) <= settings.SIMILAR_RECIPES_MAX_POSTINGS or (
+                not scores
+            ):
+                for candidate in recipes:
+                    scores[candidate] = scores.get(candidate, 0.0) + weight
+            else:
+                for candidate in scores:
+                    if contains(recipes, candidate):
+                        scores[candidate] += weight
+        scores.pop(recipe_id, None)
+
+        if metric == "cosine":
+            norm = math.sqrt(sum(weight * weight for weight, _ in weights))
+            squares = self.squares
+            candidates = (
+                (shared / (norm * math.sqrt(squares[candidate])), candidate)
+                for candidate, shared in scores.items()
+            )
+        else:
+            total = sum(weight for weight, _ in weights)
+            sums = self.weights
+            candidates = (
+                (shared / (total + sums[candidate] - shared), candidate)
+                for candidate, shared in scores.items()
+            )
+        return [
+            (candidate, similarity)
+            for similarity, candidate in nlargest(limit, candidates)
+        ]
+
+
+class CooccurrenceIndex(IngredientIndex):
+    """
+    Совместная встречаемость ингредиентов для подсказок в редакторе рецепта
+
+    Разреженная симметричная матрица хранит для каждой пары ингредиентов
+    число рецептов, где они встречаются вместе. Кандидаты оцениваются
+    по PMI = ln(n(a, b) * N / (df(a) * df(b))), пары реже
+    COOCCURRENCE_MIN_COUNT рецептов не учитываются. Для каждого
+    ингредиента лучшие соседи кешируются до изменения его пар.
+    """
+
+    fields = IngredientIndex.fields + ("neighbours", "top")
+
+    def __init__(self):
+        super().__init__()
+        self.neighbours = {}
+        self.top = {}
+        self.pairs = None
+
+    def build(self):
+        self.pairs = Counter()
+        super().build()
+        neighbours = {}
+        for (first, second), count in self.pairs.items():
+            neighbours.setdefault(first, {})[second] = count
+            neighbours.setdefault(second, {})[first] = count
+        self.pairs = None
+        self.neighbours = neighbours
+        self.top = {}
+
+    # Counter.update перебирает пары каждого рецепта в C
+    def add_recipe(self, recipe_id, ingredient_ids):
+        super().add_recipe(recipe_id, ingredient_ids)
+        self.pairs.update(combinations(ingredient_ids, 2))
+
+    def apply(self, recipe_id, old_ingredients, new_ingredients):
+        new_ingredients = set(new_ingredients)
+        current = set(self.ingredients.get(recipe_id, ()))
+        super().apply(recipe_id, old_ingredients, new_ingredients)
+        for first, second in combinations(current, 2):
+            self.add_pair(first, second, -1)
+        for first, second in combinations(new_ingredients, 2):
+            self.add_pair(first, second, 1)
+        # PMI остальных пар с изменившейся частотой ингредиента
+        # уточняется при следующем построении
+        for ingredient_id in current | new_ingredients:
+            self.top.pop(ingredient_id, None)
+
+    def add_pair(self, first, second, delta):
+        for source, target in ((first, second), (second, first)):
+            counts = self.neighbours.setdefault(source, {})
+            count = counts.get(target, 0) + delta
+            if count > 0:
+                counts[target] = count
+            else:
+                counts.pop(target, None)
+
+    def suggest(self, ingredient_ids, limit):
+        """
+        Возвращает ингредиенты, которые часто встречаются с выбранными.
+
+        :param ingredient_ids: Идентификаторы выбранных ингредиентов
+        :param limit: Число подсказок
+        :return: Пары (ingredient_id, сумма PMI с выбранными) по убыванию
+        """
+
+        self.ensure_fresh()
+        with self.lock:
+            chosen = set(ingredient_ids)
+            scores = Counter()
+            for ingredient_id in chosen:
+                scores.update(self.top_neighbours(ingredient_id))
+            for ingredient_id in chosen:
+                scores.pop(ingredient_id, None)
+            return scores.most_common(limit)
+
+    def top_neighbours(self, ingredient_id):
+        top = self.top.get(ingredient_id)
+        if top is None:
+            top = self.top[ingredient_id] = dict(
+                nlargest(
+                    settings.COOCCURRENCE_TOP_NEIGHBOURS,
+                    self.pmi(ingredient_id),
+                    key=itemgetter(1),
+                )
+            )
+        return top
+
+    def pmi(self, ingredient_id):
+        recipes = self.postings.get(ingredient_id)
+        if not recipes:
+            return
+        base = math.log(self.recipe_count / len(recipes))
+        for other, count in self.neighbours.get(ingredient_id, {}).items():
+            if count < settings.COOCCURRENCE_MIN_COUNT:
+                continue
+            score = base + math.log(count / len(self.postings[other]))
+            if score > 0:
+                yield other, score
+
+
+# Каждый эндпоинт строит только нужные ему данные: поиск по продуктам,
+# похожие рецепты без сохраненного результата и подсказки ингредиентов
+ingredient_index = IngredientIndex()
+similarity_index = SimilarityIndex()
+cooccurrence_index = CooccurrenceIndex()
+recipe_indexes = (ingredient_index, similarity_index, cooccurrence_index)
+
+
+def warm_up():
+    """
+    Строит индексы в фоновом потоке после запуска процесса gunicorn.
+    """
+
+    def build():
+        try:
+            for index in recipe_indexes:
+                index.ensure_fresh()
+        except Exception:
+            logger.exception("Не удалось построить индексы рецептов")
+        finally:
+            connections.close_all()
+
+    threading.Thread(target=build, daemon=True).start()
@@ -0,0 +1,154 @@
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+
+from api.constants import SEARCH_CONFIG, SEARCH_HIGHLIGHT
+
+WORD = re.compile(r"\w+")
+
+
+class PostgreSQLRecipeSearch:
+    """
+    Полнотекстовый поиск рецептов в PostgreSQL
+
+    Столбец recipes_recipe.search_vector обновляется триггером, условие
+    @@ обслуживает GIN-индекс recipe_search_idx. Запрос разбирается
+    websearch_to_tsquery, поэтому поддерживаются кавычки, or и минус.
+    """
+
+    query = f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)"
+
+    def filter(self, queryset, text):
+        return queryset.filter(
+            RawSQL(
+                f'"recipes_recipe"."search_vector" @@ {self.query}',
+                (text,),
+                output_field=BooleanField(),
+            )
+        ).annotate(
+            search_rank=RawSQL(
+                f'ts_rank("recipes_recipe"."search_vector", {self.query})',
+                (text,),
+                output_field=FloatField(),
+            )
+        )
+
+    def highlight(self, connection, ids, text):
+        selection = (
+            f"StartSel={SEARCH_HIGHLIGHT[0]}, StopSel={SEARCH_HIGHLIGHT[1]}"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT id,
+                    ts_headline('{SEARCH_CONFIG}', name, query, %s),
+                    ts_headline('{SEARCH_CONFIG}', text, query, %s)
+                FROM recipes_recipe, {self.query} AS query
+                WHERE id = ANY(%s)
+                """,
+                (
+                    f"{selection}, HighlightAll=true",
+                    f"{selection}, MaxFragments=2, MaxWords=20, MinWords=5",
+                    text,
+                    list(ids),
+                ),
+            )
+            return cursor.fetchall()
+
+
+class SQLiteRecipeSearch:
+    """
+    Полнотекстовый поиск рецептов в SQLite через FTS5
+
+    Используется в тестах и при локальной разработке. Слова запроса ищутся
+    по префиксу, все слова должны встречаться в рецепте.
+    """
+
+    @staticmethod
+    def match(text):
+        return " ".join(f'"{word}"*' for word in WORD.findall(text))
+
+    # Вспомогательные функции FTS5 доступны только при соединении с
+    # таблицей, поэтому вместо подзапроса используется extra
+    def filter(self, queryset, text):
+        return queryset.extra(
+            tables=["recipes_recipe_fts"],
+            where=[
+                'recipes_recipe_fts.rowid = "recipes_recipe"."id"',
+                "recipes_recipe_fts MATCH %s",
+            ],
+            params=[self.match(text)],
+            select={"search_rank": "-bm25(recipes_recipe_fts, 10.0, 1.0)"},
+        )
+
+    def highlight(self, connection, ids, text):
+        ids = list(ids)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT rowid, "
+                "highlight(recipes_recipe_fts, 0, %s, %s), "
+                "snippet(recipes_recipe_fts, 1, %s, %s, '…', 20) "
+                "FROM recipes_recipe_fts WHERE recipes_recipe_fts MATCH %s "
+                f"AND rowid IN ({', '.join(['%s'] * len(ids))})",
+                (*SEARCH_HIGHLIGHT, *SEARCH_HIGHLIGHT, self.match(text), *ids),
+            )
+            return cursor.fetchall()
+
+
+BACKENDS = {
+    "postgresql": PostgreSQLRecipeSearch(),
+    "sqlite": SQLiteRecipeSearch(),
+}
+
+
+class RecipeSearch:
+    """
+    Сервис полнотекстового поиска рецептов по названию и описанию
+    """
+
+    @staticmethod
+    def backend(alias):
+        connection = connections[alias]
+        if connection.vendor not in BACKENDS:
+            raise NotImplementedError(
+                f"Поиск рецептов не поддерживается для {connection.vendor}"
+            )
+        return BACKENDS[connection.vendor]
+
+    @staticmethod
+    def filter(queryset, text):
+        """
+        Оставляет рецепты, подходящие под запрос, по убыванию релевантности.
+
+        :param queryset: Выборка рецептов, в том числе отфильтрованная
+        :param text: Текст поискового запроса
+        :return: Выборка с аннотацией search_rank
+        """
+
+        if not WORD.search(text):
+            return queryset.none()
+        return (
+            RecipeSearch.backend(queryset.db)
+            .filter(queryset, text)
+            .order_by("-search_rank", "-created_at")
+        )
+
+    @staticmethod
+    def highlight(recipes, text):
+        """
+        Добавляет рецептам страницы подсвеченные фрагменты одним запросом.
+
+        :param recipes: Рецепты, найденные RecipeSearch.filter
+        :param text: Текст поискового запроса
+        """
+
+        recipes = {recipe.pk: recipe for recipe in recipes}
+        if not recipes:
+            return
+        alias = next(iter(recipes.values()))._state.db
+        for pk, name, fragment in RecipeSearch.backend(alias).highlight(
+            connections[alias], recipes, text
+        ):
+            recipes[pk].search_highlight = {"name": name, "text": fragment}
@@ -1,16 +1,30 @@
+import json
 import re
 
+from django.contrib.auth import authenticate
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models import Prefetch, prefetch_related_objects
+from django.db.models.functions import Lower
+from djoser.serializers import TokenCreateSerializer
 from drf_extra_fields.fields import Base64ImageField
 
 from rest_framework import serializers
+from rest_framework.utils import html
 from rest_framework.generics import get_object_or_404
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+)
+from rest_framework_simplejwt.tokens import RefreshToken
 
+from users.authentication import is_token_revoked
 from users.models import CustomUser, Subscription
 from recipes.models import (
     Ingredient,
     Recipe,
     RecipeIngredient,
+    SimilarRecipe,
     Tag,
 )
 from .constants import (
@@ -19,9 +33,32 @@ from .constants import (
     MIN_COOKING_TIME,
     MAX_COOKING_TIME,
 )
+from .fields import (
+    BulkPrimaryKeyRelatedField,
+    ImageVariantsField,
+    RecipeImageField,
+)
+from .images import schedule_variants
+from .recipe_index import RecipeChanges
+
+
+class SparseFieldsMixin:
+    """
+    Миксин для сериализаторов, поддерживающих ограничение набора полей
+
+    Принимает необязательный аргумент fields со списком полей, которые
+    нужно оставить в ответе.
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop("fields", None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
 
 
-class UserSerializers(serializers.ModelSerializer):
+class UserSerializers(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Сериализатор пользователей
     """
@@ -47,10 +84,13 @@ class UserSerializers(serializers.ModelSerializer):
 
     # Метод для определения, подписан ли текущий пользователь на объект пользователя.
     def get_is_subscribed(self, obj):
+        is_subscribed = getattr(obj, "is_subscribed", None)
+        if is_subscribed is not None:
+            return is_subscribed
         user = self.context["request"].user
-        if user.is_authenticated and user != obj:
+        if user.is_authenticated and user.id != obj.id:
             return Subscription.objects.filter(
-                subscriber=user, subscribed_to=obj
+                subscriber_id=user.id, subscribed_to=obj
             ).exists()
         return False
 
@@ -68,6 +108,19 @@ class UserSerializers(serializers.ModelSerializer):
             return data
         return super().to_representation(instance)
 
+    # Проверка уникальности email без учета регистра
+    def validate_email(self, value):
+        users = CustomUser.objects.alias(email_lower=Lower("email")).filter(
+            email_lower=value.lower()
+        )
+        if self.instance is not None:
+            users = users.exclude(pk=self.instance.pk)
+        if users.exists():
+            raise serializers.ValidationError(
+                {"message": "Пользователь с таким email уже существует."}
+            )
+        return value
+
     # Валидация имени пользователя
     def validate_username(self, value):
         if not re.match(r"^[\w.@+-]+\Z", value):
@@ -98,6 +151,58 @@ class CustomSetPasswordSerializer(serializers.Serializer):
     current_password = serializers.CharField()
 
 
+class EmailTokenCreateSerializer(TokenCreateSerializer):
+    """
+    Сериализатор входа по email и паролю
+
+    В отличие от сериализатора djoser не ищет пользователя повторно,
+    если аутентификация не прошла.
+    """
+
+    def validate(self, attrs):
+        self.user = authenticate(
+            request=self.context.get("request"),
+            email=attrs.get("email"),
+            password=attrs.get("password"),
+        )
+        if self.user is None:
+            self.fail("invalid_credentials")
+        return attrs
+
+
+class EmailTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    Сериализатор выдачи подписанных токенов по email и паролю
+    """
+
+    username_field = "email"
+
+
+class RevocableTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Сериализатор обновления токена с проверкой списка отозванных
+    """
+
+    def validate(self, attrs):
+        if is_token_revoked(RefreshToken(attrs["refresh"])):
+            raise InvalidToken("Токен отозван.")
+        return super().validate(attrs)
+
+
+class TokenRevokeSerializer(serializers.Serializer):
+    """
+    Сериализатор отзыва refresh-токена
+    """
+
+    refresh = serializers.CharField(required=False)
+
+    def validate_refresh(self, value):
+        try:
+            return RefreshToken(value)
+        except TokenError:
+            raise serializers.ValidationError("Недействительный токен.")
+
+
 class TagSerializer(serializers.ModelSerializer):
     """
     Сериализатор тегов
@@ -139,13 +244,8 @@ class RecipeIngredientWriteSerializer(serializers.ModelSerializer):
     Сериализатор для записи ингредиентов рецепта
     """
 
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all(),
-        source="ingredient",
-        error_messages={
-            "does_not_exist": "Ингредиент" " с id {pk_value} не существует."
-        },
-    )
+    # Ингредиенты загружаются одним запросом в RecipeWriteSerializer
+    id = serializers.IntegerField(source="ingredient")
     amount = serializers.IntegerField(
         validators=[
             MinValueValidator(
@@ -166,10 +266,8 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
     """
 
     ingredients = RecipeIngredientWriteSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True, queryset=Tag.objects.all()
-    )
-    image = Base64ImageField()
+    tags = BulkPrimaryKeyRelatedField(many=True, queryset=Tag.objects.all())
+    image = RecipeImageField()
     cooking_time = serializers.IntegerField(
         validators=[
             MinValueValidator(
@@ -195,9 +293,37 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
 
     # Переопределение метода сериализации для представления данных в виде объекта RecipeReadSerializer
     def to_representation(self, instance):
+        prefetch_related_objects(
+            [instance],
+            "tags",
+            Prefetch(
+                "recipe_ingredients",
+                queryset=RecipeIngredient.objects.select_related(
+                    "ingredient"
+                ),
+            ),
+        )
         serializer = RecipeReadSerializer(instance, context=self.context)
         return serializer.data
 
+    # В multipart/form-data ингредиенты можно передать JSON-строкой
+    def to_internal_value(self, data):
+        if html.is_html_input(data) and isinstance(
+            data.get("ingredients"), str
+        ):
+            try:
+                ingredients = json.loads(data["ingredients"])
+            except ValueError:
+                raise serializers.ValidationError(
+                    {"ingredients": ["Некорректный JSON."]}
+                )
+            data = {
+                key: data.getlist(key) if key == "tags" else data[key]
+                for key in data
+            }
+            data["ingredients"] = ingredients
+        return super().to_internal_value(data)
+
     # Дополнительная валидация поля image
     def validate_image(self, value):
         if not value:
@@ -224,11 +350,21 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 {"message": "Поле ingredients не может быть пустым."}
             )
-        ingredient_ids = [item["ingredient"].id for item in value]
+        ingredient_ids = [item["ingredient"] for item in value]
         if len(ingredient_ids) != len(set(ingredient_ids)):
             raise serializers.ValidationError(
                 {"message": "Ингредиенты не должны повторяться."}
             )
+        ingredients = Ingredient.objects.in_bulk(ingredient_ids)
+        for item in value:
+            if item["ingredient"] not in ingredients:
+                raise serializers.ValidationError(
+                    {
+                        "message": f"Ингредиент с id {item['ingredient']} "
+                        "не существует."
+                    }
+                )
+            item["ingredient"] = ingredients[item["ingredient"]]
         return value
 
     # Общая валидация данных
@@ -250,7 +386,16 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
 
     # Обработка ингредиентов
     def handle_ingredients(self, recipe, ingredients_data):
-        RecipeIngredient.objects.filter(recipe=recipe).delete()
+        current = RecipeIngredient.objects.filter(recipe=recipe)
+        old_ingredients = (
+            list(current.values_list("ingredient_id", flat=True))
+            if self.instance is not None
+            else []
+        )
+        current.delete()
+        # Похожие рецепты по старому составу пересчитываются при запросе
+        if self.instance is not None:
+            SimilarRecipe.objects.filter(recipe=recipe).delete()
 
         recipe_ingredients = [
             RecipeIngredient(
@@ -263,6 +408,11 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
 
         recipe_ingredients.sort(key=lambda x: x.ingredient.name)
         RecipeIngredient.objects.bulk_create(recipe_ingredients)
+        RecipeChanges.record(
+            recipe.id,
+            old_ingredients,
+            [item.ingredient_id for item in recipe_ingredients],
+        )
 
     # Метод создания нового объекта рецепта
     def create(self, validated_data):
@@ -274,6 +424,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
 
         self.handle_tags(recipe, tags_data)
         self.handle_ingredients(recipe, ingredients_data)
+        schedule_variants(recipe.image.name)
 
         return recipe
 
@@ -295,10 +446,12 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             self.handle_ingredients(instance, ingredients_data)
 
         instance.save()
+        if "image" in validated_data:
+            schedule_variants(instance.image.name)
         return instance
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
+class RecipeReadSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Сериализатор для чтения рецептов
     """
@@ -311,6 +464,7 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     )
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_variants = ImageVariantsField(source="image")
 
     class Meta:
         model = Recipe
@@ -323,12 +477,34 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             "is_in_shopping_cart",
             "name",
             "image",
+            "image_variants",
             "text",
             "cooking_time",
         )
 
+    # Результаты поиска дополняются релевантностью и подсвеченным текстом,
+    # результаты поиска по продуктам - покрытием ингредиентов
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        rank = getattr(instance, "search_rank", None)
+        if rank is not None:
+            data["search"] = {
+                "rank": rank,
+                **getattr(instance, "search_highlight", {}),
+            }
+        coverage = getattr(instance, "coverage", None)
+        if coverage is not None:
+            data["coverage"] = coverage
+        similarity = getattr(instance, "similarity", None)
+        if similarity is not None:
+            data["similarity"] = similarity
+        return data
+
     # Определение, добавлен ли рецепт в избранное у текущего пользователя
     def get_is_favorited(self, obj):
+        is_favorited = getattr(obj, "is_favorited", None)
+        if is_favorited is not None:
+            return is_favorited
         user = self.context["request"].user
         if user.is_authenticated:
             return user.favorites.filter(recipe=obj).exists()
@@ -336,20 +512,59 @@ class RecipeReadSerializer(serializers.ModelSerializer):
 
     # Определение, добавлен ли рецепт в список покупок у текущего пользователя
     def get_is_in_shopping_cart(self, obj):
+        is_in_shopping_cart = getattr(obj, "is_in_shopping_cart", None)
+        if is_in_shopping_cart is not None:
+            return is_in_shopping_cart
         user = self.context["request"].user
         if user.is_authenticated:
             return user.shopping_lists.filter(recipe=obj).exists()
         return False
 
 
+class RecipeNormalizedSerializer(RecipeReadSerializer):
+    """
+    Сериализатор для чтения рецептов в нормализованном виде
+
+    Вместо вложенных объектов автора и тегов возвращает их id, сами
+    объекты передаются один раз на страницу в поле included.
+    """
+
+    author = None
+    tags = None
+    author_id = serializers.ReadOnlyField()
+    tag_ids = serializers.PrimaryKeyRelatedField(
+        source="tags", many=True, read_only=True
+    )
+
+    # Соответствие полей-ссылок полям исходного сериализатора
+    reference_fields = {"author_id": "author", "tag_ids": "tags"}
+
+    class Meta(RecipeReadSerializer.Meta):
+        fields = (
+            "id",
+            "tag_ids",
+            "author_id",
+            "ingredients",
+            "is_favorited",
+            "is_in_shopping_cart",
+            "name",
+            "image",
+            "image_variants",
+            "text",
+            "cooking_time",
+        )
+
+
 class RecipeLightSerializer(serializers.ModelSerializer):
     """
     Упрощенный сериализатор для рецептов
     """
 
+    image_variants = ImageVariantsField(source="image")
+
     class Meta:
         model = Recipe
-        fields = ("id", "name", "image", "cooking_time")
+        fields = ("id", "name", "image", "image_variants", "cooking_time")
 
 
 class SubscriptionSerializer(serializers.ModelSerializer):
@@ -358,7 +573,7 @@ class SubscriptionSerializer(serializers.ModelSerializer):
     """
 
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.ReadOnlyField(source="author_recipes.count")
+    recipes_count = serializers.SerializerMethodField()
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
@@ -374,27 +589,40 @@ class SubscriptionSerializer(serializers.ModelSerializer):
             "recipes_count",
         )
 
+    # Значение параметра recipes_limit или None, если он не задан
+    @staticmethod
+    def get_recipes_limit(request):
+        recipes_limit = request.query_params.get("recipes_limit")
+        if recipes_limit and recipes_limit.isdigit():
+            return int(recipes_limit)
+        return None
+
     # Получение списка рецептов для пользователя, на которого подписан текущий пользователь
     def get_recipes(self, obj):
-        recipes_limit_param = self.context["request"].query_params.get(
-            "recipes_limit"
-        )
-        recipes_limit = (
-            int(recipes_limit_param)
-            if recipes_limit_param and recipes_limit_param.isdigit()
-            else None
-        )
-        recipes = obj.author_recipes.all()[:recipes_limit]
+        recipes = getattr(obj, "limited_recipes", None)
+        if recipes is None:
+            recipes = obj.author_recipes.all()[
+                : self.get_recipes_limit(self.context["request"])
+            ]
         return RecipeLightSerializer(
             recipes, many=True, context=self.context
         ).data
 
+    def get_recipes_count(self, obj):
+        recipes_count = getattr(obj, "recipes_count", None)
+        if recipes_count is not None:
+            return recipes_count
+        return obj.author_recipes.count()
+
     # Определение, подписан ли текущий пользователь на объект пользователя
     def get_is_subscribed(self, obj):
+        is_subscribed = getattr(obj, "is_subscribed", None)
+        if is_subscribed is not None:
+            return is_subscribed
         user = self.context["request"].user
         if user.is_authenticated:
             return Subscription.objects.filter(
-                subscriber=user, subscribed_to=obj
+                subscriber_id=user.id, subscribed_to=obj
             ).exists()
         return False
 
@@ -1,10 +1,17 @@
+from django.db.models import Count, Exists, OuterRef, Prefetch, Sum, Value
 from django.shortcuts import get_object_or_404
 
 from rest_framework import status
 from rest_framework.response import Response
 
-from api.serializers import RecipeLightSerializer
-from recipes.models import Recipe
+from api.serializers import RecipeLightSerializer, RecipeReadSerializer
+from recipes.models import (
+    Favorite,
+    Recipe,
+    RecipeIngredient,
+    ShoppingList,
+)
+from users.models import CustomUser, Subscription
 
 
 class RecipeListService:
@@ -51,3 +58,173 @@ class RecipeListService:
         return Response(
             {"message": error_message}, status=status.HTTP_400_BAD_REQUEST
         )
+
+
+class QuerySetService:
+    """
+    Сервис для построения выборок пользователей и рецептов
+
+    Все связанные данные, нужные сериализаторам, загружаются заранее
+    фиксированным числом запросов, независимо от размера страницы.
+    Если передан список полей ответа, загружаются только нужные для
+    них столбцы и связи.
+    """
+
+    user_columns = ("email", "username", "first_name", "last_name")
+    # Столбцы рецепта, необходимые для полей ответа
+    recipe_columns = {
+        "author": "author",
+        "name": "name",
+        "image": "image",
+        "image_variants": "image",
+        "text": "text",
+        "cooking_time": "cooking_time",
+    }
+
+    @staticmethod
+    def users(user, queryset=None, fields=None):
+        """
+        Возвращает выборку пользователей с признаком подписки.
+
+        :param user: Текущий пользователь
+        :param queryset: Исходная выборка, по умолчанию все пользователи
+        :param fields: Поля ответа или None, если нужны все поля
+        :return: Выборка с аннотацией is_subscribed для авторизованных
+        """
+
+        if queryset is None:
+            queryset = CustomUser.objects.all()
+        if fields is not None:
+            queryset = queryset.only(
+                "id",
+                *(
+                    column
+                    for column in QuerySetService.user_columns
+                    if column in fields
+                ),
+            )
+        if user.is_authenticated and (
+            fields is None or "is_subscribed" in fields
+        ):
+            queryset = queryset.annotate(
+                is_subscribed=Exists(
+                    Subscription.objects.filter(
+                        subscriber_id=user.id, subscribed_to=OuterRef("pk")
+                    )
+                )
+            )
+        return queryset
+
+    @staticmethod
+    def recipes(user, queryset=None, fields=None):
+        """
+        Возвращает выборку рецептов с предзагруженными связями.
+
+        :param user: Текущий пользователь
+        :param queryset: Исходная выборка, по умолчанию все рецепты
+        :param fields: Поля ответа или None, если нужны все поля
+        :return: Выборка с авторами, тегами, ингредиентами и аннотациями
+                 is_favorited и is_in_shopping_cart для авторизованных
+        """
+
+        if queryset is None:
+            queryset = Recipe.objects.all()
+        if fields is None:
+            fields = RecipeReadSerializer.Meta.fields
+        else:
+            queryset = queryset.only(
+                "id",
+                *{
+                    column
+                    for field, column in QuerySetService.recipe_columns.items()
+                    if field in fields
+                },
+            )
+
+        if "tags" in fields:
+            queryset = queryset.prefetch_related("tags")
+        if "ingredients" in fields:
+            queryset = queryset.prefetch_related(
+                Prefetch(
+                    "recipe_ingredients",
+                    queryset=RecipeIngredient.objects.select_related(
+                        "ingredient"
+                    ),
+                )
+            )
+        if not user.is_authenticated:
+            if "author" in fields:
+                queryset = queryset.select_related("author")
+            return queryset
+
+        if "author" in fields:
+            queryset = queryset.prefetch_related(
+                Prefetch("author", queryset=QuerySetService.users(user))
+            )
+        if "is_favorited" in fields:
+            queryset = queryset.annotate(
+                is_favorited=Exists(
+                    Favorite.objects.filter(
+                        user_id=user.id, recipe=OuterRef("pk")
+                    )
+                )
+            )
+        if "is_in_shopping_cart" in fields:
+            queryset = queryset.annotate(
+                is_in_shopping_cart=Exists(
+                    ShoppingList.objects.filter(
+                        user_id=user.id, recipe=OuterRef("pk")
+                    )
+                )
+            )
+        return queryset
+
+    @staticmethod
+    def subscriptions(user, recipes_limit=None):
+        """
+        Возвращает авторов, на которых подписан пользователь.
+
+        :param user: Текущий пользователь
+        :param recipes_limit: Сколько последних рецептов загрузить для
+                              каждого автора, None - все
+        :return: Выборка с аннотациями recipes_count и is_subscribed и
+                 рецептами в атрибуте limited_recipes
+        """
+
+        recipes = Recipe.objects.only(
+            "id", "author", "name", "image", "cooking_time"
+        )
+        return (
+            CustomUser.objects.filter(followers__subscriber_id=user.id)
+            .annotate(
+                recipes_count=Count("author_recipes"),
+                is_subscribed=Value(True),
+            )
+            .order_by("followers__id")
+            .prefetch_related(
+                Prefetch(
+                    "author_recipes",
+                    queryset=recipes[:recipes_limit],
+                    to_attr="limited_recipes",
+                )
+            )
+        )
+
+    @staticmethod
+    def shopping_cart(user):
+        """
+        Возвращает суммарное количество ингредиентов из списка покупок.
+
+        :param user: Пользователь, которому принадлежит список
+        :return: Значения ingredient__name, ingredient__measurement_unit и
+                 total_amount, отсортированные по названию ингредиента
+        """
+
+        return (
+            RecipeIngredient.objects.filter(
+                recipe__shopping_list_recipes__user=user
+            )
+            .values("ingredient__name", "ingredient__measurement_unit")
+            .annotate(total_amount=Sum("amount"))
+            .order_by("ingredient__name")
+        )
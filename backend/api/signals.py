@@ -0,0 +1,25 @@
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver
+
+from api.recipe_index import RecipeChanges
+from recipes.models import Recipe
+
+
+# К post_delete ингредиенты рецепта уже удалены каскадно. Запрос идет на
+# каждый удаляемый рецепт: при удалении автора это N запросов. Общий запрос
+# через post_delete у RecipeIngredient отключил бы быстрое удаление
+# ингредиентов и добавил запрос к каждому изменению рецепта, а удаление
+# автора со многими рецептами бывает редко
+@receiver(pre_delete, sender=Recipe)
+def remember_recipe_ingredients(sender, instance, **kwargs):
+    instance.deleted_ingredients = list(
+        instance.recipe_ingredients.values_list("ingredient_id", flat=True)
+    )
+
+
+# Удаление рецепта из API, админки или каскадом вместе с автором
+@receiver(post_delete, sender=Recipe)
+def record_recipe_deletion(sender, instance, **kwargs):
+    RecipeChanges.record(
+        instance.id, getattr(instance, "deleted_ingredients", ()), []
+    )
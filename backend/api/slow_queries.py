@@ -0,0 +1,100 @@
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+
+from django.db import DatabaseError, transaction
+
+from api.instrumentation import current_metrics
+
+logger = logging.getLogger("api.slow_queries")
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+PLACEHOLDER = re.compile(r"%s|\?")
+VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(sql):
+    """
+    Возвращает нормализованный SQL и его короткий хеш.
+
+    Литералы и параметры заменяются на ?, списки значений IN (...)
+    сворачиваются, поэтому запросы, отличающиеся только значениями и
+    размером страницы, получают один отпечаток.
+    """
+
+    normalized = STRING_LITERAL.sub("?", sql)
+    normalized = NUMBER_LITERAL.sub("?", normalized)
+    normalized = PLACEHOLDER.sub("?", normalized)
+    normalized = VALUE_LIST.sub("(...)", normalized)
+    normalized = WHITESPACE.sub(" ", normalized).strip()
+    digest = hashlib.md5(normalized.encode(), usedforsecurity=False)
+    return normalized, digest.hexdigest()[:12]
+
+
+class SlowQueryLog:
+    """
+    Журнал медленных SQL-запросов
+
+    Обертка для connection.execute_wrapper: запросы дольше порога пишутся
+    в лог api.slow_queries строкой JSON с отпечатком, длительностью,
+    представлением и действием. Для доли explain_rate медленных SELECT на
+    PostgreSQL добавляется план EXPLAIN (ANALYZE, BUFFERS), при этом
+    запрос выполняется повторно.
+    """
+
+    def __init__(self, threshold_ms, explain_rate, path=None):
+        self.threshold = threshold_ms / 1000
+        self.explain_rate = explain_rate
+        self.path = path
+        self.explaining = False
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration = time.perf_counter() - started
+        if duration >= self.threshold and not self.explaining:
+            self.record(sql, params, many, context["connection"], duration)
+        return result
+
+    def record(self, sql, params, many, connection, duration):
+        normalized, digest = fingerprint(sql)
+        metrics = current_metrics.get()
+        entry = {
+            "time": round(time.time(), 3),
+            "fingerprint": digest,
+            "sql": normalized,
+            "duration_ms": round(duration * 1000, 2),
+            "route": metrics.route if metrics is not None else None,
+            "path": self.path,
+        }
+        if self.should_explain(sql, many, connection):
+            entry["plan"] = self.explain(sql, params, connection)
+        logger.warning(json.dumps(entry, ensure_ascii=False))
+
+    def should_explain(self, sql, many, connection):
+        return (
+            connection.vendor == "postgresql"
+            and not many
+            and sql.lstrip()[:6].upper() == "SELECT"
+            and random.random() < self.explain_rate
+        )
+
+    # Ошибка EXPLAIN не должна прерывать транзакцию запроса
+    def explain(self, sql, params, connection):
+        self.explaining = True
+        try:
+            with transaction.atomic(using=connection.alias):
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"EXPLAIN (ANALYZE, BUFFERS) {sql}", params
+                    )
+                    return "\n".join(row[0] for row in cursor.fetchall())
+        except DatabaseError as error:
+            return f"EXPLAIN failed: {error}"
+        finally:
+            self.explaining = False
@@ -0,0 +1,208 @@
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, reverse
+from PIL import Image
+from rest_framework.test import APIClient
+
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingList,
+    Tag,
+)
+from users.models import CustomUser, Subscription
+
+PAGE_SIZES = (1, 5, 10)
+# Маршруты, время ответа которых определяется хешированием пароля
+EXCLUDED_ROUTES = ("login", "logout", "user-set-password")
+
+
+class QueryBudget:
+    """
+    Допустимое число запросов к базе для маршрута api.urls
+
+    Бюджет задается числом или функцией размера страницы. Числовой бюджет
+    означает, что число запросов не должно расти вместе с размером
+    страницы, то есть в ответе нет запросов на каждый объект. С
+    expect_results ответ должен содержать хотя бы один объект, чтобы
+    бюджет не выполнялся за счет пустого результата.
+    """
+
+    def __init__(
+        self,
+        route,
+        budget,
+        method="get",
+        kwargs=None,
+        query="",
+        data=None,
+        anonymous=False,
+        expect_results=False,
+    ):
+        self.route = route
+        self.budget = budget
+        self.method = method
+        self.kwargs = kwargs
+        self.query = query
+        self.data = data
+        self.anonymous = anonymous
+        self.expect_results = expect_results
+
+    def __str__(self):
+        name = f"{self.method.upper()} {self.route}"
+        return f"{name} (аноним)" if self.anonymous else name
+
+    @property
+    def is_constant(self):
+        return not callable(self.budget)
+
+    def get_limit(self, size):
+        return self.budget if self.is_constant else self.budget(size)
+
+    def get_path(self, fixtures):
+        kwargs = self.kwargs(fixtures) if self.kwargs else None
+        if callable(self.query):
+            query = self.query(fixtures)
+        else:
+            query = self.query.format(
+                size=fixtures.size, prefix=fixtures.prefix
+            )
+        path = reverse(self.route, kwargs=kwargs)
+        return f"{path}?{query}" if query else path
+
+
+class BudgetFixtures:
+    """
+    Данные, объем которых растет вместе с размером страницы
+
+    Создается size авторов по size рецептов, у каждого рецепта size тегов
+    и не меньше двух ингредиентов. Пользователь viewer подписан на всех
+    авторов и добавил все их рецепты в избранное и список покупок, а на
+    пользователя stranger не подписан. У stranger есть
+    COOCCURRENCE_MIN_COUNT рецептов, поэтому при любом размере у
+    ингредиентов есть подсказки.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.prefix = f"budget{size}x"
+        self.image = self.placeholder_image()
+        self.tags = Tag.objects.bulk_create(
+            Tag(
+                name=f"{self.prefix}{number}",
+                slug=f"{self.prefix}{number}",
+                color="#49B64E",
+            )
+            for number in range(size)
+        )
+        self.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f"{self.prefix}{number}", measurement_unit="г")
+            for number in range(max(size, 2))
+        )
+        self.viewer = self.create_user("viewer")
+        self.stranger = self.create_user("stranger")
+        self.authors = [
+            self.create_user(f"author{number}") for number in range(size)
+        ]
+        self.own_recipe = self.create_recipe(self.viewer)
+        for _ in range(settings.COOCCURRENCE_MIN_COUNT):
+            self.create_recipe(self.stranger)
+        self.recipes = [
+            self.create_recipe(author)
+            for author in self.authors
+            for _ in range(size)
+        ]
+        Subscription.objects.bulk_create(
+            Subscription(subscriber=self.viewer, subscribed_to=author)
+            for author in self.authors
+        )
+        for model in (Favorite, ShoppingList):
+            model.objects.bulk_create(
+                model(user=self.viewer, recipe=recipe)
+                for recipe in self.recipes
+            )
+
+    @staticmethod
+    def placeholder_image():
+        buffer = BytesIO()
+        Image.new("RGB", (64, 48), "#49B64E").save(buffer, "PNG")
+        return Recipe._meta.get_field("image").storage.save(
+            "placeholder.png", ContentFile(buffer.getvalue())
+        )
+
+    def create_user(self, name):
+        return CustomUser.objects.create(
+            username=f"{self.prefix}{name}",
+            email=f"{self.prefix}{name}@example.com",
+            first_name=name,
+            last_name=name,
+        )
+
+    def create_recipe(self, author):
+        recipe = Recipe.objects.create(
+            author=author,
+            name=f"{self.prefix} рецепт",
+            image=self.image,
+            text="Описание",
+            cooking_time=10,
+        )
+        recipe.tags.set(self.tags)
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=10)
+            for ingredient in self.ingredients
+        )
+        return recipe
+
+    def recipe_data(self):
+        return {
+            "ingredients": [
+                {"id": ingredient.id, "amount": 100}
+                for ingredient in self.ingredients
+            ],
+            "tags": [tag.id for tag in self.tags],
+            "image": "data:image/gif;base64,R0lGODlhAQABAIAAAAUEBAAAACwAAAAA"
+            "AQABAAACAkQBADs=",
+            "name": "Новый рецепт",
+            "text": "Описание",
+            "cooking_time": 5,
+        }
+
+
+def uncovered_routes(budgets):
+    """
+    Возвращает имена маршрутов api.urls, для которых не задан бюджет.
+    """
+
+    covered = {budget.route for budget in budgets}.union(EXCLUDED_ROUTES)
+    routes = get_resolver("api.urls").reverse_dict.keys()
+    return sorted(
+        route
+        for route in routes
+        if isinstance(route, str) and route not in covered
+    )
+
+
+def measure(budget, fixtures):
+    """
+    Выполняет запрос бюджета к API, изменения в базе откатываются.
+
+    :return: Пара (CaptureQueriesContext с запросами, ответ)
+    """
+
+    client = APIClient(REMOTE_ADDR="192.0.2.1")
+    if not budget.anonymous:
+        client.force_authenticate(fixtures.viewer)
+    request = getattr(client, budget.method)
+    data = budget.data(fixtures) if budget.data else None
+    path = budget.get_path(fixtures)
+    with transaction.atomic():
+        with CaptureQueriesContext(connection) as queries:
+            response = request(path, data, format="json")
+        transaction.set_rollback(True)
+    return queries, response
@@ -0,0 +1,46 @@
+import shutil
+import tempfile
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from api.management.commands.check_indexes import Command
+from api.tests.support import BudgetFixtures
+
+
+@skipUnless(
+    connection.vendor == "postgresql", "Планы проверяются на PostgreSQL"
+)
+class HotQueryIndexTests(TestCase):
+    """
+    Использование индексов основными запросами API
+
+    Те же запросы, что проверяет команда check_indexes. Таблицы тестовой
+    базы малы, поэтому последовательное чтение отключается, и проверяется,
+    что для запроса есть подходящий индекс.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        media_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        cls.addClassCleanup(media.disable)
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixtures = BudgetFixtures(3)
+
+    def test_hot_queries_use_indexes(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        for label, queryset, indexes in Command.hot_queries(
+            self.fixtures.viewer, self.fixtures.authors[0]
+        ):
+            with self.subTest(label):
+                plan = queryset.explain()
+                for index in indexes:
+                    self.assertIn(index, plan, plan)
@@ -0,0 +1,183 @@
+import logging
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
+
+from api.recipe_index import recipe_indexes
+from api.tests.support import (
+    PAGE_SIZES,
+    BudgetFixtures,
+    QueryBudget,
+    measure,
+    uncovered_routes,
+)
+
+QUERY_BUDGETS = (
+    QueryBudget("api-root", 0),
+    QueryBudget("tag-list", 1),
+    QueryBudget("tag-detail", 1, kwargs=lambda f: {"pk": f.tags[0].id}),
+    QueryBudget("ingredient-list", 1, query="name={prefix}"),
+    QueryBudget(
+        "ingredient-detail", 1, kwargs=lambda f: {"pk": f.ingredients[0].id}
+    ),
+    QueryBudget(
+        "ingredient-suggest",
+        1,
+        query=lambda f: "ingredients=" + str(f.ingredients[0].id),
+        expect_results=True,
+    ),
+    QueryBudget("recipe-list", 5, query="limit={size}"),
+    QueryBudget("recipe-list", 4, query="limit={size}", anonymous=True),
+    QueryBudget(
+        "recipe-list",
+        6,
+        query="limit={size}&tags={prefix}0&is_favorited=1",
+    ),
+    QueryBudget("recipe-list", 5, query="limit={size}&normalized=1"),
+    QueryBudget(
+        "recipe-list",
+        6,
+        query="limit={size}&search=рецепт",
+        expect_results=True,
+    ),
+    QueryBudget("recipe-list", 4, query="limit={size}&ordering=trending"),
+    QueryBudget(
+        "recipe-cook-with",
+        4,
+        query=lambda f: f"limit={f.size}&ingredients="
+        + ",".join(str(ingredient.id) for ingredient in f.ingredients),
+    ),
+    QueryBudget(
+        "recipe-detail", 4, kwargs=lambda f: {"pk": f.recipes[0].id}
+    ),
+    QueryBudget(
+        "recipe-similar", 7, kwargs=lambda f: {"pk": f.recipes[0].id}
+    ),
+    QueryBudget(
+        "recipe-list",
+        11,
+        method="post",
+        data=lambda f: f.recipe_data(),
+    ),
+    QueryBudget(
+        "recipe-detail",
+        14,
+        method="patch",
+        kwargs=lambda f: {"pk": f.own_recipe.id},
+        data=lambda f: f.recipe_data(),
+    ),
+    QueryBudget(
+        "recipe-favorite",
+        5,
+        method="post",
+        kwargs=lambda f: {"pk": f.own_recipe.id},
+    ),
+    QueryBudget(
+        "recipe-shopping-cart",
+        5,
+        method="post",
+        kwargs=lambda f: {"pk": f.own_recipe.id},
+    ),
+    QueryBudget("recipe-download-shopping-cart", 1),
+    QueryBudget("user-list", 2, query="limit={size}"),
+    QueryBudget("user-list", 2, query="limit={size}", anonymous=True),
+    QueryBudget("user-detail", 1, kwargs=lambda f: {"pk": f.authors[0].id}),
+    QueryBudget("user-me", 0),
+    QueryBudget("user-subscriptions", 3, query="limit={size}"),
+    QueryBudget(
+        "user-subscriptions", 3, query="limit={size}&recipes_limit={size}"
+    ),
+    QueryBudget(
+        "user-subscribe",
+        7,
+        method="post",
+        kwargs=lambda f: {"pk": f.stranger.id},
+    ),
+)
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Число SQL-запросов маршрутов API при нескольких размерах страницы
+
+    Для каждого бюджета из QUERY_BUDGETS создается отдельный тест.
+    Числовой бюджет также означает, что число запросов не растет с
+    размером страницы. Изображения рецептов сохраняются во временный
+    MEDIA_ROOT, который удаляется после тестов.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        media_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_settings = override_settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        cls.addClassCleanup(media_settings.disable)
+        # Строки лога каждого запроса не нужны в выводе тестов
+        logger = logging.getLogger("api.requests")
+        cls.addClassCleanup(logger.setLevel, logger.level)
+        logger.setLevel(logging.WARNING)
+        # Индексы в памяти сбрасываются после отката данных класса
+        for index in recipe_indexes:
+            cls.addClassCleanup(index.reset)
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixtures = {size: BudgetFixtures(size) for size in PAGE_SIZES}
+        for index in recipe_indexes:
+            index.refresh()
+
+    def check_budget(self, budget):
+        counts = {}
+        for size in PAGE_SIZES:
+            queries, response = measure(budget, self.fixtures[size])
+            self.assertLess(
+                response.status_code,
+                400,
+                f"{budget}: ответ {response.status_code} при размере "
+                f"{size}: {getattr(response, 'data', '')}",
+            )
+            limit = budget.get_limit(size)
+            self.assertLessEqual(
+                len(queries),
+                limit,
+                f"{budget}: {len(queries)} запросов при размере {size}, "
+                f"бюджет {limit}:\n"
+                + "\n".join(query["sql"] for query in queries),
+            )
+            counts[size] = len(queries)
+            if budget.expect_results:
+                results = response.data
+                if isinstance(results, dict):
+                    results = results["results"]
+                self.assertTrue(
+                    results, f"{budget}: пустой ответ при размере {size}"
+                )
+        if budget.is_constant:
+            self.assertEqual(
+                len(set(counts.values())),
+                1,
+                f"{budget}: число запросов растет с размером страницы "
+                f"{counts}",
+            )
+
+    def test_all_routes_have_budgets(self):
+        self.assertEqual(uncovered_routes(QUERY_BUDGETS), [])
+
+
+def budget_test(budget):
+    def test(self):
+        self.check_budget(budget)
+
+    return test
+
+
+for number, budget in enumerate(QUERY_BUDGETS):
+    name = f"{budget.method}_{budget.route}".replace("-", "_")
+    setattr(
+        QueryBudgetTests,
+        f"test_{number:02d}_{name}",
+        budget_test(budget),
+    )
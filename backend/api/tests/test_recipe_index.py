@@ -0,0 +1,94 @@
+from django.test import TestCase
+
+from api.recipe_index import CooccurrenceIndex, IngredientIndex
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+from users.models import CustomUser
+
+
+class RecipeIndexReplayTests(TestCase):
+    """
+    Повторное применение изменений, которые уже попали в индекс
+
+    Изменения, зафиксированные во время построения, применяются к индексу
+    еще раз. Результат должен совпадать с индексом, построенным заново.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        author = CustomUser.objects.create(
+            username="replay", email="replay@example.com"
+        )
+        cls.ingredients = [
+            ingredient.id
+            for ingredient in Ingredient.objects.bulk_create(
+                Ingredient(name=f"replay{number}", measurement_unit="г")
+                for number in range(4)
+            )
+        ]
+        cls.recipes = [
+            Recipe.objects.create(
+                author=author,
+                name="Рецепт",
+                image="recipes/images/replay.png",
+                text="Описание",
+                cooking_time=10,
+            ).id
+            for _ in range(3)
+        ]
+
+    def set_ingredients(self, recipe_id, ingredient_ids):
+        RecipeIngredient.objects.filter(recipe_id=recipe_id).delete()
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe_id=recipe_id, ingredient_id=ingredient_id, amount=10
+            )
+            for ingredient_id in ingredient_ids
+        )
+
+    @staticmethod
+    def snapshot(index):
+        data = {
+            "postings": {
+                ingredient_id: list(recipes)
+                for ingredient_id, recipes in index.postings.items()
+                if recipes
+            },
+            "ingredients": {
+                recipe_id: list(ingredients)
+                for recipe_id, ingredients in index.ingredients.items()
+            },
+            "sizes": list(index.sizes),
+            "recipe_count": index.recipe_count,
+        }
+        if isinstance(index, CooccurrenceIndex):
+            data["neighbours"] = {
+                ingredient_id: counts
+                for ingredient_id, counts in index.neighbours.items()
+                if counts
+            }
+        return data
+
+    def test_replayed_changes_match_rebuild(self):
+        first, second, third, fourth = self.ingredients
+        changes = [
+            (self.recipes[0], (), (first, second)),
+            (self.recipes[1], (), (first, second, third)),
+            (self.recipes[0], (first, second), (second, third)),
+            (self.recipes[0], (second, third), (third, fourth)),
+            (self.recipes[1], (first, second, third), ()),
+        ]
+        # Третий рецепт не меняется, его пары не должны сдвинуться
+        self.set_ingredients(self.recipes[2], self.ingredients)
+        for recipe_id, _, ingredient_ids in changes:
+            self.set_ingredients(recipe_id, ingredient_ids)
+        for index_class in (IngredientIndex, CooccurrenceIndex):
+            with self.subTest(index_class.__name__):
+                index = index_class()
+                index.build()
+                for change in changes:
+                    index.apply(*change)
+                expected = index_class()
+                expected.build()
+                self.assertEqual(
+                    self.snapshot(index), self.snapshot(expected)
+                )
@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler
+
+from rest_framework.exceptions import ValidationError
+
+from .constants import MAX_IMAGE_SIZE
+from .fields import IMAGE_TOO_LARGE_MESSAGE
+
+
+class ImageSizeLimitUploadHandler(FileUploadHandler):
+    """
+    Обработчик загрузки, ограничивающий размер изображения
+
+    Запрос с заведомо слишком большим телом отклоняется до чтения, прием
+    файла прерывается, как только получено больше MAX_IMAGE_SIZE байт.
+    Сами данные передаются следующим обработчикам, которые сохраняют
+    файл в памяти или во временный файл на диске.
+    """
+
+    def handle_raw_input(
+        self, input_data, META, content_length, boundary, encoding=None
+    ):
+        if content_length > (
+            MAX_IMAGE_SIZE + settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+        ):
+            raise ValidationError({"image": [IMAGE_TOO_LARGE_MESSAGE]})
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > MAX_IMAGE_SIZE:
+            raise ValidationError({self.field_name: [IMAGE_TOO_LARGE_MESSAGE]})
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
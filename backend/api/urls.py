@@ -1,9 +1,11 @@
+from django.conf import settings
 from django.urls import include, path, re_path
 
 from rest_framework.routers import DefaultRouter
 
 from .views import UserViewSet
 from .views import IngredientViewSet, RecipeViewSet, TagViewSet
+from .views import TokenRevokeView
 
 router = DefaultRouter()
 router.register("users", UserViewSet, basename="user")
@@ -15,3 +17,11 @@ urlpatterns = [
     path("", include(router.urls)),
     re_path(r"auth/", include("djoser.urls.authtoken")),
 ]
+
+if settings.JWT_AUTH:
+    urlpatterns += [
+        path(
+            "auth/jwt/logout/", TokenRevokeView.as_view(), name="jwt-logout"
+        ),
+        re_path(r"auth/", include("djoser.urls.jwt")),
+    ]
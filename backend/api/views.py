@@ -1,13 +1,16 @@
-from django.db.models import Sum, Case, Value, When
-from django.http import HttpResponse
+import hmac
+import re
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
 from django.utils.text import slugify
 from django_filters.rest_framework import DjangoFilterBackend
 from django.contrib.auth import update_session_auth_hash
-from django.db import models
 from djoser.serializers import SetPasswordSerializer
 
 from rest_framework import mixins, status, viewsets, permissions
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import (
     AllowAny,
     IsAuthenticatedOrReadOnly,
@@ -15,29 +18,174 @@ from rest_framework.permissions import (
 )
 from rest_framework.response import Response
 from rest_framework.generics import get_object_or_404
-
+from rest_framework.views import APIView
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import Token
+
+from api.constants import (
+    COOK_WITH_MAX_RESULTS,
+    COOK_WITH_MIN_COVERAGE,
+    INGREDIENT_SUGGESTIONS_LIMIT,
+    INGREDIENT_SUGGESTIONS_MAX_LIMIT,
+    MAX_BATCH_ID,
+    MAX_BATCH_IDS,
+    RECIPE_RANKINGS,
+    SIMILAR_RECIPES_LIMIT,
+    SIMILAR_RECIPES_MAX_LIMIT,
+)
 from api.filters import IngredientSearchFilter, RecipeFilter
-from api.paginations import CustomPagination
+from api.images import (
+    VARIANT_CACHE_CONTROL,
+    generate_variant,
+    get_image_storage,
+    get_variant_storage,
+    parse_variant_name,
+)
+from api.paginations import CustomPagination, KeysetPagination
+from api.search import RecipeSearch
 from api.permissions import IsRecipeAuthorOrReadOnly
+from api.recipe_index import (
+    cooccurrence_index,
+    ingredient_index,
+    similarity_index,
+)
 from api.serializers import (
     IngredientSerializer,
+    RecipeNormalizedSerializer,
     RecipeReadSerializer,
     RecipeWriteSerializer,
     TagSerializer,
     ManageSubscriptionSerializer,
     SubscriptionSerializer,
+    TokenRevokeSerializer,
     UserSerializers,
 )
-from api.services import RecipeListService
+from api.services import QuerySetService, RecipeListService
+from api.uploads import ImageSizeLimitUploadHandler
 from recipes.models import (
     Favorite,
     Ingredient,
     Recipe,
-    RecipeIngredient,
     ShoppingList,
+    SimilarRecipe,
     Tag,
 )
-from users.models import CustomUser, Subscription
+from users.authentication import revoke_token, revoke_user_tokens
+from users.models import CustomUser
+
+
+class BatchRetrieveMixin:
+    """
+    Миксин для получения нескольких объектов по списку идентификаторов
+
+    Запрос вида ?ids=3,1,2 обрабатывается действием list и использует
+    ту же выборку, что и постраничный список. Объекты возвращаются в
+    запрошенном порядке, ненайденные идентификаторы перечисляются в
+    поле missing.
+    """
+
+    batch_param = "ids"
+
+    def list(self, request, *args, **kwargs):
+        if self.batch_param in request.query_params:
+            return self.batch_retrieve(request)
+        return super().list(request, *args, **kwargs)
+
+    # Разбор и проверка списка идентификаторов из параметра запроса
+    def get_batch_ids(self, request, param=None):
+        param = param or self.batch_param
+        raw_ids = request.query_params.get(param, "").split(",")
+        if len(raw_ids) > MAX_BATCH_IDS:
+            raise ValidationError(
+                {param: f"Можно запросить не более {MAX_BATCH_IDS} объектов."}
+            )
+        ids = []
+        for raw_id in raw_ids:
+            raw_id = raw_id.strip()
+            # Длина проверяется до int(), значение - по диапазону bigint
+            if (
+                not re.fullmatch(r"\d{1,19}", raw_id, re.ASCII)
+                or int(raw_id) > MAX_BATCH_ID
+            ):
+                raise ValidationError(
+                    {param: "Идентификаторы должны быть числами."}
+                )
+            ids.append(int(raw_id))
+        return list(dict.fromkeys(ids))
+
+    def batch_retrieve(self, request):
+        ids = self.get_batch_ids(request)
+        queryset = self.filter_queryset(self.get_queryset())
+        objects = {obj.pk: obj for obj in queryset.filter(pk__in=ids)}
+        serializer = self.get_serializer(
+            [objects[pk] for pk in ids if pk in objects], many=True
+        )
+        return Response(
+            {
+                "results": serializer.data,
+                "missing": [pk for pk in ids if pk not in objects],
+            }
+        )
+
+
+class SparseFieldsViewMixin:
+    """
+    Миксин для выбора полей ответа через параметры запроса
+
+    ?fields=id,name оставляет в ответе только перечисленные поля,
+    ?omit=text,ingredients исключает перечисленные поля. Выбранные
+    поля передаются сериализатору и в get_queryset, чтобы не загружать
+    лишние столбцы и связи. Применяется только к запросам на чтение.
+    """
+
+    fields_param = "fields"
+    omit_param = "omit"
+
+    @staticmethod
+    def split_fields(value):
+        return [name.strip() for name in value.split(",") if name.strip()]
+
+    # Список запрошенных полей или None, если нужны все поля
+    def get_requested_fields(self):
+        if not hasattr(self, "_requested_fields"):
+            self._requested_fields = self.parse_requested_fields()
+        return self._requested_fields
+
+    def parse_requested_fields(self):
+        params = self.request.query_params
+        if self.request.method not in permissions.SAFE_METHODS or (
+            self.fields_param not in params and self.omit_param not in params
+        ):
+            return None
+
+        available = list(
+            self.get_serializer_class()(
+                context=self.get_serializer_context()
+            ).fields
+        )
+        fields = (
+            self.split_fields(params[self.fields_param])
+            if self.fields_param in params
+            else available
+        )
+        omit = self.split_fields(params.get(self.omit_param, ""))
+        unknown = (set(fields) | set(omit)) - set(available)
+        if unknown:
+            raise ValidationError(
+                {
+                    self.fields_param: "Неизвестные поля: "
+                    f"{', '.join(sorted(unknown))}."
+                }
+            )
+        return [
+            name for name in available if name in fields and name not in omit
+        ]
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_requested_fields()
+        if fields is not None:
+            kwargs["fields"] = fields
+        return super().get_serializer(*args, **kwargs)
 
 
 class BaseViewSet(
@@ -61,7 +209,7 @@ class TagViewSet(BaseViewSet):
     serializer_class = TagSerializer
 
 
-class IngredientViewSet(BaseViewSet):
+class IngredientViewSet(BatchRetrieveMixin, BaseViewSet):
     """
     ViewSet для ингредиентов
     """
@@ -71,8 +219,44 @@ class IngredientViewSet(BaseViewSet):
     filter_backends = (IngredientSearchFilter,)
     search_fields = ["^name"]
 
+    # Подсказки ингредиентов, которые часто встречаются с выбранными
+    # в редакторе рецепта (?ingredients=1,2,3&limit=10)
+    @action(detail=False, methods=["get"])
+    def suggest(self, request):
+        ingredient_ids = self.get_batch_ids(request, "ingredients")
+        try:
+            limit = int(
+                request.query_params.get(
+                    "limit", INGREDIENT_SUGGESTIONS_LIMIT
+                )
+            )
+        except ValueError:
+            limit = 0
+        if not 0 < limit <= INGREDIENT_SUGGESTIONS_MAX_LIMIT:
+            raise ValidationError(
+                {
+                    "limit": "Укажите число от 1 до "
+                    f"{INGREDIENT_SUGGESTIONS_MAX_LIMIT}."
+                }
+            )
 
-class RecipeViewSet(viewsets.ModelViewSet):
+        found = cooccurrence_index.suggest(ingredient_ids, limit)
+        ingredients = Ingredient.objects.in_bulk(
+            [ingredient_id for ingredient_id, _ in found]
+        )
+        results = []
+        for ingredient_id, score in found:
+            ingredient = ingredients.get(ingredient_id)
+            if ingredient is not None:
+                data = self.get_serializer(ingredient).data
+                data["score"] = round(score, 3)
+                results.append(data)
+        return Response(results)
+
+
+class RecipeViewSet(
+    SparseFieldsViewMixin, BatchRetrieveMixin, viewsets.ModelViewSet
+):
     """
     ViewSet для рецептов
     """
@@ -82,13 +266,189 @@ class RecipeViewSet(viewsets.ModelViewSet):
     pagination_class = CustomPagination
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
+    normalized_param = "normalized"
+    search_param = "search"
+    ordering_param = "ordering"
+
+    # Ограничение размера изображения при загрузке через multipart/form-data
+    def initialize_request(self, request, *args, **kwargs):
+        request.upload_handlers.insert(
+            0, ImageSizeLimitUploadHandler(request)
+        )
+        return super().initialize_request(request, *args, **kwargs)
+
+    # Предзагрузка связей для действий чтения
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ["list", "retrieve", "cook_with", "similar"]:
+            fields = self.get_requested_fields()
+            if fields is not None and self.is_normalized():
+                fields = [
+                    RecipeNormalizedSerializer.reference_fields.get(
+                        name, name
+                    )
+                    for name in fields
+                ]
+            return QuerySetService.recipes(
+                self.request.user, queryset, fields
+            )
+        return queryset
 
     # Выбор класса сериализатора в зависимости от действия
     def get_serializer_class(self):
-        if self.action in ["list", "retrieve"]:
+        if self.action == "list" and self.is_normalized():
+            return RecipeNormalizedSerializer
+        if self.action in ["list", "retrieve", "cook_with", "similar"]:
             return RecipeReadSerializer
         return RecipeWriteSerializer
 
+    # Список по рейтингу выводится по ключу (?ordering=popular|trending)
+    @property
+    def paginator(self):
+        field = RECIPE_RANKINGS.get(
+            self.request.query_params.get(self.ordering_param)
+        )
+        if self.action != "list" or field is None:
+            return super().paginator
+        if not hasattr(self, "_paginator"):
+            self._paginator = KeysetPagination(field)
+        return self._paginator
+
+    # Запрошен ли список в нормализованном виде (?normalized=true)
+    def is_normalized(self):
+        return self.request.query_params.get(self.normalized_param) in (
+            "1",
+            "true",
+        )
+
+    # Рецепты страницы для поля included и подсветки результатов поиска
+    def get_serializer(self, *args, **kwargs):
+        if kwargs.get("many"):
+            if self.is_normalized():
+                self.listed_recipes = list(args[0])
+            # ?search фильтрует только список, в cook_with и similar
+            # подсветка лишь добавила бы запрос
+            search = self.request.query_params.get(self.search_param)
+            if search and self.action == "list":
+                RecipeSearch.highlight(args[0], search)
+        return super().get_serializer(*args, **kwargs)
+
+    # Список рецептов, в нормализованном виде дополненный полем included
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if self.is_normalized() and response.status_code == status.HTTP_200_OK:
+            response.data["included"] = self.get_included(
+                getattr(self, "listed_recipes", [])
+            )
+        return response
+
+    # Авторы и теги рецептов страницы, каждый объект сериализуется один раз
+    def get_included(self, recipes):
+        fields = self.get_requested_fields()
+        context = self.get_serializer_context()
+        included = {}
+        if fields is None or "author_id" in fields:
+            authors = {recipe.author_id: recipe.author for recipe in recipes}
+            included["authors"] = {
+                author["id"]: author
+                for author in UserSerializers(
+                    authors.values(), many=True, context=context
+                ).data
+            }
+        if fields is None or "tag_ids" in fields:
+            tags = {
+                tag.id: tag for recipe in recipes for tag in recipe.tags.all()
+            }
+            included["tags"] = {
+                tag["id"]: tag
+                for tag in TagSerializer(tags.values(), many=True).data
+            }
+        return included
+
+    # Поиск рецептов по имеющимся продуктам (?ingredients=1,2,3)
+    @action(detail=False, methods=["get"])
+    def cook_with(self, request):
+        ingredient_ids = self.get_batch_ids(request, "ingredients")
+        try:
+            min_coverage = float(
+                request.query_params.get(
+                    "min_coverage", COOK_WITH_MIN_COVERAGE
+                )
+            )
+        except ValueError:
+            min_coverage = -1
+        if not 0 < min_coverage <= 1:
+            raise ValidationError(
+                {"min_coverage": "Укажите число больше 0 и не больше 1."}
+            )
+
+        found = ingredient_index.search(
+            ingredient_ids, min_coverage, COOK_WITH_MAX_RESULTS
+        )
+        page = self.paginate_queryset(found)
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in page]
+        )
+        results = []
+        for recipe_id, coverage, missing in page:
+            recipe = recipes.get(recipe_id)
+            if recipe is not None:
+                recipe.coverage = {
+                    "coverage": round(coverage, 3),
+                    "missing": missing,
+                }
+                results.append(recipe)
+        serializer = self.get_serializer(results, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    # Похожие рецепты: сохраненные командой compute_similar_recipes или
+    # найденные по индексу ингредиентов (?limit=10)
+    @action(detail=True, methods=["get"])
+    def similar(self, request, pk=None):
+        try:
+            limit = int(
+                request.query_params.get("limit", SIMILAR_RECIPES_LIMIT)
+            )
+        except ValueError:
+            limit = 0
+        if not 0 < limit <= SIMILAR_RECIPES_MAX_LIMIT:
+            raise ValidationError(
+                {
+                    "limit": "Укажите число от 1 до "
+                    f"{SIMILAR_RECIPES_MAX_LIMIT}."
+                }
+            )
+
+        recipe = get_object_or_404(Recipe.objects.only("id"), pk=pk)
+        found = list(
+            SimilarRecipe.objects.filter(recipe=recipe)
+            .order_by("-score")
+            .values_list("similar_id", "score")[:limit]
+        )
+        if not found:
+            ingredients = list(
+                recipe.recipe_ingredients.values_list(
+                    "ingredient_id", flat=True
+                )
+            )
+            found = similarity_index.similar(
+                recipe.id,
+                ingredients,
+                limit,
+                settings.SIMILAR_RECIPES_METRIC,
+            )
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _ in found]
+        )
+        results = []
+        for recipe_id, score in found:
+            similar = recipes.get(recipe_id)
+            if similar is not None:
+                similar.similarity = round(score, 3)
+                results.append(similar)
+        serializer = self.get_serializer(results, many=True)
+        return Response(serializer.data)
+
     @action(detail=True, methods=[])
     def favorite(self, request, pk=None):
         pass
@@ -144,14 +504,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def download_shopping_cart(self, request):
         user = request.user
 
-        ingredients_summary = (
-            RecipeIngredient.objects.filter(
-                recipe__shopping_list_recipes__user=user
-            )
-            .values("ingredient__name", "ingredient__measurement_unit")
-            .annotate(total_amount=Sum("amount"))
-            .order_by("ingredient__name")
-        )
+        ingredients_summary = QuerySetService.shopping_cart(user)
 
         content = "Список ингредиентов для покупки:\n"
         for ingredient in ingredients_summary:
@@ -170,12 +523,14 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return response
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(
+    SparseFieldsViewMixin, BatchRetrieveMixin, viewsets.ModelViewSet
+):
     """
     ViewSet для пользователей
     """
 
-    queryset = CustomUser.objects.all()
+    queryset = CustomUser.objects.order_by("id")
     serializer_class = UserSerializers
     pagination_class = CustomPagination
 
@@ -189,17 +544,11 @@ class UserViewSet(viewsets.ModelViewSet):
 
     # Возвращает права доступа в зависимости от действия
     def get_queryset(self):
-        user = self.request.user
-        queryset = CustomUser.objects.all()
-        if user.is_authenticated:
-            queryset = queryset.annotate(
-                is_subscribed=Case(
-                    When(followers__subscriber=user, then=Value(True)),
-                    default=Value(False),
-                    output_field=models.BooleanField(),
-                )
-            )
-        return queryset
+        return QuerySetService.users(
+            self.request.user,
+            super().get_queryset(),
+            fields=self.get_requested_fields(),
+        )
 
     # Возвращает запрос на выборку пользователей
     @action(detail=False, methods=["get"])
@@ -233,6 +582,7 @@ class UserViewSet(viewsets.ModelViewSet):
             user.set_password(new_password)
             user.save()
             update_session_auth_hash(request, user)
+            revoke_user_tokens(user.id)
             return Response(
                 {"message": "Пароль успешно изменен"},
                 status=status.HTTP_204_NO_CONTENT,
@@ -253,14 +603,9 @@ class SubscriptionViewSet(viewsets.ModelViewSet):
 
     # Получение списка подписок пользователя
     def list(self, request):
-        user = request.user
-        subscriptions = Subscription.objects.filter(
-            subscriber=user
-        ).select_related("subscribed_to")
-
-        subscribed_users = [
-            subscription.subscribed_to for subscription in subscriptions
-        ]
+        subscribed_users = QuerySetService.subscriptions(
+            request.user, SubscriptionSerializer.get_recipes_limit(request)
+        )
 
         page = self.paginate_queryset(subscribed_users)
         if page is not None:
@@ -307,3 +652,61 @@ class SubscriptionViewSet(viewsets.ModelViewSet):
         )
         result = serializer.remove_subscription()
         return Response(result, status=status.HTTP_204_NO_CONTENT)
+
+
+class TokenRevokeView(APIView):
+    """
+    Отзыв подписанных токенов (выход из системы)
+
+    Отзывает access-токен запроса и переданный refresh-токен.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = TokenRevokeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if isinstance(request.auth, Token):
+            revoke_token(request.auth)
+        refresh = serializer.validated_data.get("refresh")
+        if refresh is not None:
+            if refresh[api_settings.USER_ID_CLAIM] != request.user.id:
+                return Response(
+                    {"message": "Токен принадлежит другому пользователю."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            revoke_token(refresh)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+def image_variant(request, name):
+    """
+    Отдает уменьшенную копию изображения, создавая ее при первом запросе
+
+    Готовые копии отдает nginx, сюда попадают только запросы к копиям,
+    которых еще нет на диске.
+    """
+
+    parsed = parse_variant_name(f"variants/{name}")
+    if parsed is None or not get_image_storage().exists(parsed[0]):
+        raise Http404
+    variant = generate_variant(*parsed)
+    response = FileResponse(get_variant_storage().open(variant))
+    response["Cache-Control"] = VARIANT_CACHE_CONTROL
+    return response
+
+
+# Метрики Prometheus, доступны только с токеном METRICS_TOKEN
+def metrics(request):
+    token = settings.METRICS_TOKEN
+    if not settings.METRICS_ENABLED or not token:
+        raise Http404
+    if not hmac.compare_digest(
+        request.headers.get("Authorization", ""), f"Bearer {token}"
+    ):
+        return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+
+    from api.metrics import render_metrics
+
+    content, content_type = render_metrics()
+    return HttpResponse(content, content_type=content_type)
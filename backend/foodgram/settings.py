@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 import os
+from datetime import timedelta
 from pathlib import Path
 
 from decouple import config
@@ -45,7 +46,6 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
-    "debug_toolbar",
     "django_filters",
     "rest_framework.authtoken",
     "djoser",
@@ -57,6 +57,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.middleware.RequestInstrumentationMiddleware",
+    "api.middleware.SlowQueryLogMiddleware",
+    "api.middleware.NPlusOneMiddleware",
+    "api.middleware.RequestProfilingMiddleware",
+    "api.middleware.MemoryProfilingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -64,9 +69,101 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
-    "debug_toolbar.middleware.DebugToolbarMiddleware",
 ]
 
+# Debug toolbar подключается только при разработке
+if DEBUG:
+    INSTALLED_APPS.append("debug_toolbar")
+    MIDDLEWARE.append("debug_toolbar.middleware.DebugToolbarMiddleware")
+
+# Строка лога api.requests для каждого запроса
+REQUEST_INSTRUMENTATION = config(
+    "REQUEST_INSTRUMENTATION", default=True, cast=bool
+)
+# Заголовок Server-Timing раскрывает клиентам время SQL-запросов, а учет
+# времени сериализации подменяет BaseSerializer.data, поэтому по умолчанию
+# они включены только при разработке
+SERVER_TIMING = config("SERVER_TIMING", default=DEBUG, cast=bool)
+
+# Метрики Prometheus по адресу /internal/metrics (nginx его не проксирует).
+# Для нескольких процессов gunicorn переменная окружения
+# PROMETHEUS_MULTIPROC_DIR должна указывать на общий каталог
+METRICS_ENABLED = config("METRICS_ENABLED", default=False, cast=bool)
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+
+# Профилирование отдельных запросов: доля случайных запросов или запросы
+# с заголовком X-Profile из команды profile_header. Профили в формате
+# collapsed stacks сохраняются в PROFILE_DIR, пустое значение - выключено
+PROFILE_DIR = config("PROFILE_DIR", default="")
+PROFILE_SAMPLE_RATE = config("PROFILE_SAMPLE_RATE", default=0.0, cast=float)
+PROFILE_INTERVAL_MS = config("PROFILE_INTERVAL_MS", default=5, cast=int)
+PROFILE_HEADER_MAX_AGE = config(
+    "PROFILE_HEADER_MAX_AGE", default=3600, cast=int
+)
+
+# Профилирование памяти по представлениям (tracemalloc и RSS процессов).
+# Данные процессов пишутся в MEMORY_PROFILE_DIR и собираются командой
+# memory_report, пустое значение - выключено
+MEMORY_PROFILE_DIR = config("MEMORY_PROFILE_DIR", default="")
+MEMORY_SNAPSHOT_RATE = config(
+    "MEMORY_SNAPSHOT_RATE", default=0.05, cast=float
+)
+MEMORY_TRACE_FRAMES = config("MEMORY_TRACE_FRAMES", default=1, cast=int)
+MEMORY_TOP_SITES = 10
+MEMORY_FLUSH_INTERVAL = 30
+
+# Поиск N+1: warn - запись в лог api.n_plus_one, raise - исключение,
+# пустое значение - выключено. Не предназначен для production
+NPLUSONE_MODE = config("NPLUSONE_MODE", default="")
+NPLUSONE_THRESHOLD = config("NPLUSONE_THRESHOLD", default=3, cast=int)
+
+# Журнал медленных SQL-запросов с ротацией файла, пустое значение -
+# выключено. Для доли SLOW_QUERY_EXPLAIN_RATE медленных SELECT на
+# PostgreSQL сохраняется EXPLAIN (ANALYZE, BUFFERS)
+SLOW_QUERY_LOG = config("SLOW_QUERY_LOG", default="")
+SLOW_QUERY_THRESHOLD_MS = config(
+    "SLOW_QUERY_THRESHOLD_MS", default=100, cast=float
+)
+SLOW_QUERY_EXPLAIN_RATE = config(
+    "SLOW_QUERY_EXPLAIN_RATE", default=0.1, cast=float
+)
+SLOW_QUERY_LOG_BYTES = 10 * 1024 * 1024
+SLOW_QUERY_LOG_BACKUPS = 5
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "api.requests": {
+            "handlers": ["console"],
+            "level": config("REQUEST_LOG_LEVEL", default="INFO"),
+            "propagate": False,
+        },
+        "api.n_plus_one": {
+            "handlers": ["console"],
+            "level": "WARNING",
+            "propagate": False,
+        },
+    },
+}
+
+if SLOW_QUERY_LOG:
+    LOGGING["handlers"]["slow_queries"] = {
+        "class": "logging.handlers.RotatingFileHandler",
+        "filename": SLOW_QUERY_LOG,
+        "maxBytes": SLOW_QUERY_LOG_BYTES,
+        "backupCount": SLOW_QUERY_LOG_BACKUPS,
+        "encoding": "utf-8",
+    }
+    LOGGING["loggers"]["api.slow_queries"] = {
+        "handlers": ["slow_queries"],
+        "level": "WARNING",
+        "propagate": False,
+    }
+
 ROOT_URLCONF = "foodgram.urls"
 
 TEMPLATES = [
@@ -139,6 +236,12 @@ STATIC_ROOT = BASE_DIR / "collected_static"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Уменьшенные копии изображений рецептов
+IMAGE_VARIANT_WIDTHS = (320, 640, 1280)
+IMAGE_VARIANT_FORMATS = ("webp", "jpeg")
+# Потоки для создания копий после загрузки: 0 - только при первом запросе
+IMAGE_VARIANT_WORKERS = config("IMAGE_VARIANT_WORKERS", default=1, cast=int)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -146,6 +249,9 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 AUTH_USER_MODEL = "users.CustomUser"
 
+# Аутентификация по подписанным токенам (auth/jwt/...) без запроса к базе
+JWT_AUTH = config("JWT_AUTH", default=False, cast=bool)
+
 REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticatedOrReadOnly",
@@ -157,13 +263,90 @@ REST_FRAMEWORK = {
     "PAGE_SIZE": 6,
 }
 
+if JWT_AUTH:
+    REST_FRAMEWORK["DEFAULT_AUTHENTICATION_CLASSES"].insert(
+        0, "users.authentication.StatelessJWTAuthentication"
+    )
+
+SIMPLE_JWT = {
+    "ACCESS_TOKEN_LIFETIME": timedelta(
+        minutes=config("JWT_ACCESS_TOKEN_MINUTES", default=15, cast=int)
+    ),
+    "REFRESH_TOKEN_LIFETIME": timedelta(
+        days=config("JWT_REFRESH_TOKEN_DAYS", default=7, cast=int)
+    ),
+    "AUTH_HEADER_TYPES": ("Bearer",),
+    "UPDATE_LAST_LOGIN": False,
+    "TOKEN_OBTAIN_SERIALIZER": "api.serializers.EmailTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "api.serializers.RevocableTokenRefreshSerializer",
+}
+
+# Индексы рецептов в памяти процессов (поиск по продуктам, похожие
+# рецепты, подсказки ингредиентов) дополняются журналом изменений в кеше и
+# перестраиваются в фоне, если журнал неполон или индекс старше
+# RECIPE_INDEX_MAX_AGE секунд
+RECIPE_INDEX_MAX_AGE = config("RECIPE_INDEX_MAX_AGE", default=3600, cast=int)
+RECIPE_INDEX_MAX_CHANGES = 1000
+RECIPE_INDEX_CHANGES_TIMEOUT = 24 * 60 * 60
+RECIPE_INDEX_CHUNK_SIZE = 10000
+
+# Похожие рецепты: метрика cosine или jaccard по весам IDF ингредиентов.
+# Ингредиенты, которые есть больше чем в SIMILAR_RECIPES_MAX_POSTINGS
+# рецептах, не добавляют новых кандидатов
+SIMILAR_RECIPES_METRIC = config("SIMILAR_RECIPES_METRIC", default="cosine")
+SIMILAR_RECIPES_MAX_POSTINGS = 2000
+
+# Подсказки ингредиентов: пары реже COOCCURRENCE_MIN_COUNT рецептов не
+# учитываются, для ингредиента хранится COOCCURRENCE_TOP_NEIGHBOURS соседей
+COOCCURRENCE_MIN_COUNT = 3
+COOCCURRENCE_TOP_NEIGHBOURS = 100
+
+# Рейтинги рецептов (?ordering=popular|trending) пересчитываются командой
+# update_recipe_rankings. Вклад добавления в trending_score убывает вдвое
+# за RANKING_HALF_LIFE_HOURS часов, добавления моложе RANKING_LAG_SECONDS
+# секунд учитываются при следующем запуске
+RANKING_HALF_LIFE_HOURS = config(
+    "RANKING_HALF_LIFE_HOURS", default=72, cast=float
+)
+RANKING_FAVORITE_WEIGHT = 1.0
+RANKING_SHOPPING_LIST_WEIGHT = 0.5
+RANKING_LAG_SECONDS = 60
+RANKING_REBASE_HALF_LIVES = 64
+RANKING_CHUNK_SIZE = 5000
+
+# Список отозванных токенов хранится в кеше, для нескольких процессов
+# gunicorn нужен общий бэкенд (например, FileBasedCache или Redis)
+CACHES = {
+    "default": {
+        "BACKEND": config(
+            "CACHE_BACKEND",
+            default="django.core.cache.backends.locmem.LocMemCache",
+        ),
+        "LOCATION": config("CACHE_LOCATION", default=""),
+    }
+}
+
 AUTHENTICATION_BACKENDS = [
     "users.auth.EmailAuthBackend",
-    "django.contrib.auth.backends.ModelBackend",
 ]
 
+# Хеширование паролей при входе в пуле потоков процесса: 0 - в потоке
+# запроса без ограничений. Ограничение имеет смысл только для gunicorn с
+# GUNICORN_THREADS больше PASSWORD_HASHING_WORKERS + PASSWORD_HASHING_QUEUE
+GUNICORN_THREADS = config("GUNICORN_THREADS", default=1, cast=int)
+PASSWORD_HASHING_WORKERS = config(
+    "PASSWORD_HASHING_WORKERS", default=0, cast=int
+)
+PASSWORD_HASHING_QUEUE = config("PASSWORD_HASHING_QUEUE", default=2, cast=int)
+PASSWORD_HASHING_TIMEOUT = config(
+    "PASSWORD_HASHING_TIMEOUT", default=5, cast=int
+)
+
 DJOSER = {
     "LOGIN_FIELD": "email",
+    "SERIALIZERS": {
+        "token_create": "api.serializers.EmailTokenCreateSerializer",
+    },
 }
 
 INTERNAL_IPS = [
@@ -19,9 +19,13 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from api.views import image_variant, metrics
+
 urlpatterns = [
     path("api/", include("api.urls")),
     path("admin/", admin.site.urls),
+    path("media/variants/<path:name>", image_variant, name="image-variant"),
+    path("internal/metrics", metrics, name="metrics"),
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,33 @@
+import os
+import shutil
+
+bind = "0.0.0.0:8000"
+# Процесс перезапускается после заданного числа запросов, чтобы память,
+# накопленная после больших ответов, возвращалась системе
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 100))
+# При threads > 1 gunicorn использует gthread: пока одни потоки хешируют
+# пароли в пуле PASSWORD_HASHING_WORKERS, другие обслуживают запросы
+threads = int(os.environ.get("GUNICORN_THREADS", 1))
+
+
+# Файлы метрик прошлого запуска удаляются, чтобы счетчики начинались с нуля
+def on_starting(server):
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+# Индексы рецептов строятся в фоне до первых запросов процесса
+def post_worker_init(worker):
+    from api.recipe_index import warm_up
+
+    warm_up()
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
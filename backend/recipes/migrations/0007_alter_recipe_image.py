@@ -0,0 +1,19 @@
+# Generated by Django 4.2.18 on 2026-10-19 07:41
+
+from django.db import migrations, models
+import recipes.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_delete_recipetag'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(storage=recipes.storage.get_image_storage, upload_to='', verbose_name='Картинка'),
+        ),
+    ]
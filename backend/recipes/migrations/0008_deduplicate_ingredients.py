@@ -0,0 +1,46 @@
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def deduplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model("recipes", "Ingredient")
+    RecipeIngredient = apps.get_model("recipes", "RecipeIngredient")
+
+    duplicates = (
+        Ingredient.objects.values("name", "measurement_unit")
+        .annotate(keep_id=Min("id"), count=Count("id"))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates:
+        keep_id = duplicate.pop("keep_id")
+        duplicate.pop("count")
+        extra_ids = list(
+            Ingredient.objects.filter(**duplicate)
+            .exclude(id=keep_id)
+            .values_list("id", flat=True)
+        )
+        for row in RecipeIngredient.objects.filter(ingredient_id__in=extra_ids):
+            kept = RecipeIngredient.objects.filter(
+                recipe_id=row.recipe_id, ingredient_id=keep_id
+            ).first()
+            if kept is None:
+                row.ingredient_id = keep_id
+                row.save(update_fields=["ingredient"])
+            else:
+                kept.amount += row.amount
+                kept.save(update_fields=["amount"])
+                row.delete()
+        Ingredient.objects.filter(id__in=extra_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0007_alter_recipe_image"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            deduplicate_ingredients, migrations.RunPython.noop
+        ),
+    ]
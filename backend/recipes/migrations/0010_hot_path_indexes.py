@@ -0,0 +1,81 @@
+# Generated by Django 4.2.18 on 2026-10-19 08:06
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Ограничение с INCLUDE поддерживает только PostgreSQL, поэтому в модели
+# остается обычное ограничение, а amount добавляется в его индекс здесь.
+# Отдельный покрывающий индекс дублировал бы индекс ограничения
+UNIQUE_FIELDS = ("recipe", "ingredient")
+UNIQUE_NAME = "unique_recipe_ingredient"
+
+
+def replace_constraint(apps, schema_editor, include):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    model = apps.get_model("recipes", "RecipeIngredient")
+    plain = models.UniqueConstraint(fields=UNIQUE_FIELDS, name=UNIQUE_NAME)
+    covering = models.UniqueConstraint(
+        fields=UNIQUE_FIELDS, include=("amount",), name=UNIQUE_NAME
+    )
+    old, new = (plain, covering) if include else (covering, plain)
+    schema_editor.remove_constraint(model, old)
+    schema_editor.add_constraint(model, new)
+
+
+def cover_amount(apps, schema_editor):
+    replace_constraint(apps, schema_editor, include=True)
+
+
+def uncover_amount(apps, schema_editor):
+    replace_constraint(apps, schema_editor, include=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0009_ingredient_unique_ingredient_name_unit'),
+    ]
+
+    operations = [
+        # Индексы внешних ключей удаляются после создания составных
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['user', 'recipe'], name='favorite_user_recipe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['created_at', 'id'], name='recipe_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', 'created_at'], name='recipe_author_created_idx'),
+        ),
+        migrations.RunPython(cover_amount, uncover_amount),
+        migrations.AddIndex(
+            model_name='shoppinglist',
+            index=models.Index(fields=['user', 'recipe'], name='shoppinglist_user_recipe_idx'),
+        ),
+        migrations.AlterField(
+            model_name='favorite',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='favorites', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='author',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='author_recipes', to=settings.AUTH_USER_MODEL, verbose_name='Автор'),
+        ),
+        migrations.AlterField(
+            model_name='recipeingredient',
+            name='recipe',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='recipe_ingredients', to='recipes.recipe', verbose_name='Рецепт'),
+        ),
+        migrations.AlterField(
+            model_name='shoppinglist',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='shopping_lists', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+    ]
@@ -0,0 +1,81 @@
+from django.db import migrations
+
+from recipes.search_triggers import SQLITE_REBUILD, SQLITE_TRIGGERS
+
+# Название и описание рецепта с весами A и B в конфигурации russian
+POSTGRESQL_FORWARD = (
+    "ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector",
+    """
+    CREATE FUNCTION recipes_recipe_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('russian', coalesce(NEW.name, '')), 'A')
+            || setweight(to_tsvector('russian', coalesce(NEW.text, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER recipes_recipe_search_vector
+    BEFORE INSERT OR UPDATE OF name, text ON recipes_recipe
+    FOR EACH ROW EXECUTE FUNCTION recipes_recipe_search_vector()
+    """,
+    # Триггер заполняет столбец и для существующих рецептов
+    "UPDATE recipes_recipe SET name = name",
+    "CREATE INDEX recipe_search_idx ON recipes_recipe USING gin (search_vector)",
+)
+POSTGRESQL_BACKWARD = (
+    "DROP TRIGGER recipes_recipe_search_vector ON recipes_recipe",
+    "DROP FUNCTION recipes_recipe_search_vector()",
+    "ALTER TABLE recipes_recipe DROP COLUMN search_vector",
+)
+
+# Таблица FTS5 без собственной копии текста, индексирует recipes_recipe.
+# При пересоздании recipes_recipe миграциями на SQLite триггеры удаляются и
+# восстанавливаются функцией restore_triggers
+SQLITE_FORWARD = (
+    """
+    CREATE VIRTUAL TABLE recipes_recipe_fts USING fts5(
+        name, text, content='recipes_recipe', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    *SQLITE_TRIGGERS.values(),
+    SQLITE_REBUILD,
+)
+SQLITE_BACKWARD = (
+    *(f"DROP TRIGGER {name}" for name in SQLITE_TRIGGERS),
+    "DROP TABLE recipes_recipe_fts",
+)
+
+STATEMENTS = {
+    "postgresql": (POSTGRESQL_FORWARD, POSTGRESQL_BACKWARD),
+    "sqlite": (SQLITE_FORWARD, SQLITE_BACKWARD),
+}
+
+
+def run_statements(schema_editor, backward=False):
+    statements = STATEMENTS.get(schema_editor.connection.vendor)
+    if statements is None:
+        return
+    for statement in statements[backward]:
+        schema_editor.execute(statement)
+
+
+def create_search_index(apps, schema_editor):
+    run_statements(schema_editor)
+
+
+def drop_search_index(apps, schema_editor):
+    run_statements(schema_editor, backward=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0010_hot_path_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 4.2.18 on 2026-10-19 08:25
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.utils.timezone
+
+from recipes.search_triggers import restore_triggers
+
+
+# Время старых добавлений неизвестно, вместо него берется время создания
+# рецепта: добавления давних рецептов не попадают в trending_score
+def backfill_created_at(apps, schema_editor):
+    Recipe = apps.get_model("recipes", "Recipe")
+    recipe_created_at = Subquery(
+        Recipe.objects.filter(pk=OuterRef("recipe_id")).values("created_at")
+    )
+    for model_name in ("Favorite", "ShoppingList"):
+        apps.get_model("recipes", model_name).objects.update(
+            created_at=recipe_created_at
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_similarrecipe'),
+    ]
+
+    operations = [
+        # AddField пересоздает recipes_recipe на SQLite вместе с триггерами
+        migrations.RunPython(migrations.RunPython.noop, restore_triggers),
+        migrations.CreateModel(
+            name='RecipeRankingState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('processed_until', models.DateTimeField(null=True, verbose_name='Учтены добавления до')),
+                ('reference', models.DateTimeField(null=True, verbose_name='Точка отсчета затухания')),
+            ],
+            options={
+                'verbose_name': 'Состояние рейтингов',
+                'verbose_name_plural': 'Состояние рейтингов',
+            },
+        ),
+        migrations.AddField(
+            model_name='favorite',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата добавления'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='popular_score',
+            field=models.FloatField(default=0, verbose_name='Популярность'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='trending_score',
+            field=models.FloatField(default=0, verbose_name='Популярность за последнее время'),
+        ),
+        migrations.AddField(
+            model_name='shoppinglist',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата добавления'),
+        ),
+        migrations.RunPython(backfill_created_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['created_at'], name='favorite_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['popular_score', 'id'], name='recipe_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['trending_score', 'id'], name='recipe_trending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppinglist',
+            index=models.Index(fields=['created_at'], name='shoppinglist_created_idx'),
+        ),
+        migrations.RunPython(restore_triggers, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,11 @@
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.utils import timezone
 
 from colorfield.fields import ColorField
 
 from users.models import CustomUser
+from .storage import get_image_storage
 from api.constants import (
     MAX_AMOUNT,
     MAX_COOKING_TIME,
@@ -50,17 +52,25 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = "Ингредиент"
         verbose_name_plural = "Ингредиенты"
+        constraints = [
+            models.UniqueConstraint(
+                fields=("name", "measurement_unit"),
+                name="unique_ingredient_name_unit",
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
 
 class Recipe(models.Model):
+    # Поиск по автору обслуживает индекс (author, created_at)
     author = models.ForeignKey(
         CustomUser,
         related_name="author_recipes",
         blank=False,
         on_delete=models.CASCADE,
+        db_index=False,
         verbose_name="Автор",
     )
     name = models.CharField(
@@ -68,6 +78,7 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         upload_to="",
+        storage=get_image_storage,
         verbose_name="Картинка",
         blank=False,
     )
@@ -101,21 +112,48 @@ class Recipe(models.Model):
         blank=False,
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    # Рейтинги пересчитывает команда update_recipe_rankings
+    popular_score = models.FloatField(
+        default=0, verbose_name="Популярность"
+    )
+    trending_score = models.FloatField(
+        default=0, verbose_name="Популярность за последнее время"
+    )
 
+    # Поисковый индекс (столбец search_vector в PostgreSQL, таблица
+    # recipes_recipe_fts в SQLite) создается миграцией 0011_recipe_search
+    # и обновляется триггерами базы, поэтому в модели не описан
     class Meta:
         ordering = ["-created_at"]
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
+        indexes = [
+            models.Index(
+                fields=("created_at", "id"), name="recipe_created_idx"
+            ),
+            models.Index(
+                fields=("author", "created_at"),
+                name="recipe_author_created_idx",
+            ),
+            models.Index(
+                fields=("popular_score", "id"), name="recipe_popular_idx"
+            ),
+            models.Index(
+                fields=("trending_score", "id"), name="recipe_trending_idx"
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
 
 class RecipeIngredient(models.Model):
+    # Поиск по рецепту обслуживают индексы, начинающиеся с recipe
     recipe = models.ForeignKey(
         "Recipe",
         related_name="recipe_ingredients",
         on_delete=models.CASCADE,
+        db_index=False,
         verbose_name="Рецепт",
     )
     ingredient = models.ForeignKey(
@@ -138,6 +176,8 @@ class RecipeIngredient(models.Model):
     class Meta:
         verbose_name = "Ингредиент рецепта"
         verbose_name_plural = "Ингредиенты рецепта"
+        # На PostgreSQL индекс ограничения включает amount (миграция 0010),
+        # и список покупок читает количество только из индекса
         constraints = [
             models.UniqueConstraint(
                 fields=("recipe", "ingredient"),
@@ -153,10 +193,12 @@ class RecipeIngredient(models.Model):
 
 
 class Favorite(models.Model):
+    # Поиск по пользователю обслуживает индекс (user, recipe)
     user = models.ForeignKey(
         "users.CustomUser",
         on_delete=models.CASCADE,
         related_name="favorites",
+        db_index=False,
         verbose_name="Пользователь",
     )
     recipe = models.ForeignKey(
@@ -165,20 +207,31 @@ class Favorite(models.Model):
         related_name="favorite_recipes",
         verbose_name="Рецепт",
     )
+    created_at = models.DateTimeField(
+        default=timezone.now, verbose_name="Дата добавления"
+    )
 
     class Meta:
         verbose_name = "Избранное"
         verbose_name_plural = "Избранные"
+        indexes = [
+            models.Index(
+                fields=("user", "recipe"), name="favorite_user_recipe_idx"
+            ),
+            models.Index(fields=("created_at",), name="favorite_created_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.recipe.name}"
 
 
 class ShoppingList(models.Model):
+    # Поиск по пользователю обслуживает индекс (user, recipe)
     user = models.ForeignKey(
         "users.CustomUser",
         on_delete=models.CASCADE,
         related_name="shopping_lists",
+        db_index=False,
         verbose_name="Пользователь",
     )
     recipe = models.ForeignKey(
@@ -187,10 +240,72 @@ class ShoppingList(models.Model):
         related_name="shopping_list_recipes",
         verbose_name="Рецепт",
     )
+    created_at = models.DateTimeField(
+        default=timezone.now, verbose_name="Дата добавления"
+    )
 
     class Meta:
         verbose_name = "Список продуктов"
         verbose_name_plural = "Списки продуктов"
+        indexes = [
+            models.Index(
+                fields=("user", "recipe"),
+                name="shoppinglist_user_recipe_idx",
+            ),
+            models.Index(
+                fields=("created_at",), name="shoppinglist_created_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.recipe.name}"
+
+
+class SimilarRecipe(models.Model):
+    """
+    Похожий рецепт, найденный командой compute_similar_recipes
+    """
+
+    recipe = models.ForeignKey(
+        "Recipe",
+        on_delete=models.CASCADE,
+        related_name="similar_recipes",
+        verbose_name="Рецепт",
+    )
+    similar = models.ForeignKey(
+        "Recipe",
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Похожий рецепт",
+    )
+    score = models.FloatField(verbose_name="Сходство")
+
+    class Meta:
+        verbose_name = "Похожий рецепт"
+        verbose_name_plural = "Похожие рецепты"
+        constraints = [
+            models.UniqueConstraint(
+                fields=("recipe", "similar"),
+                name="unique_similar_recipe",
+            ),
+        ]
+
+
+class RecipeRankingState(models.Model):
+    """
+    Состояние пересчета рейтингов командой update_recipe_rankings
+
+    processed_until - время, до которого учтены добавления в избранное
+    и список покупок, reference - точка отсчета затухания trending_score.
+    """
+
+    processed_until = models.DateTimeField(
+        null=True, verbose_name="Учтены добавления до"
+    )
+    reference = models.DateTimeField(
+        null=True, verbose_name="Точка отсчета затухания"
+    )
+
+    class Meta:
+        verbose_name = "Состояние рейтингов"
+        verbose_name_plural = "Состояние рейтингов"
@@ -0,0 +1,54 @@
+# Таблица recipes_recipe_fts из миграции 0011 индексирует recipes_recipe
+# через триггеры. Django пересоздает recipes_recipe на SQLite при AddField,
+# AlterField и RemoveField, и триггеры удаляются вместе со старой таблицей,
+# поэтому такие миграции восстанавливают их после изменения и после отката:
+#
+#     operations = [
+#         migrations.RunPython(migrations.RunPython.noop, restore_triggers),
+#         ...
+#         migrations.RunPython(restore_triggers, migrations.RunPython.noop),
+#     ]
+#
+# Триггер PostgreSQL при изменении столбцов сохраняется
+SQLITE_TRIGGERS = {
+    "recipes_recipe_fts_insert": """
+    CREATE TRIGGER recipes_recipe_fts_insert AFTER INSERT ON recipes_recipe
+    BEGIN
+        INSERT INTO recipes_recipe_fts(rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    """,
+    "recipes_recipe_fts_delete": """
+    CREATE TRIGGER recipes_recipe_fts_delete AFTER DELETE ON recipes_recipe
+    BEGIN
+        INSERT INTO recipes_recipe_fts(recipes_recipe_fts, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+    END
+    """,
+    "recipes_recipe_fts_update": """
+    CREATE TRIGGER recipes_recipe_fts_update
+    AFTER UPDATE OF name, text ON recipes_recipe
+    BEGIN
+        INSERT INTO recipes_recipe_fts(recipes_recipe_fts, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+        INSERT INTO recipes_recipe_fts(rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    """,
+}
+SQLITE_REBUILD = (
+    "INSERT INTO recipes_recipe_fts(recipes_recipe_fts) VALUES ('rebuild')"
+)
+
+
+def restore_triggers(apps, schema_editor):
+    """
+    Создает заново триггеры FTS5 и перестраивает индекс по recipes_recipe.
+    """
+
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for name, statement in SQLITE_TRIGGERS.items():
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        schema_editor.execute(statement)
+    schema_editor.execute(SQLITE_REBUILD)
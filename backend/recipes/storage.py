@@ -0,0 +1,76 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Файловое хранилище, именующее файлы по хешу содержимого
+
+    Файл сохраняется как ab/cd/<sha256>.<расширение>, повторная загрузка
+    того же содержимого возвращает уже сохраненный файл. Содержимое по
+    имени никогда не меняется, поэтому файлы можно кешировать как
+    неизменяемые.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+
+        digest = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        name = f"{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+        # Повторная загрузка обновляет время изменения файла, чтобы
+        # collect_orphaned_media не удалил его как давно неиспользуемый
+        if self.exists(name):
+            try:
+                os.utime(self.path(name))
+                return name
+            except FileNotFoundError:
+                pass
+        return super().save(name, content, max_length)
+
+    # Файл с тем же именем содержит те же данные, суффикс к имени не нужен
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        """
+        Записывает файл во временный и переносит его под имя по хешу.
+
+        Параллельная загрузка того же содержимого после проверки exists
+        заменяет файл таким же, а не сохраняет копию с суффиксом, и
+        читатели не видят недописанный файл.
+        """
+
+        path = self.path(name)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                for chunk in content.chunks():
+                    file.write(chunk)
+            os.chmod(temporary, self.file_permissions_mode or 0o644)
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+        return name
+
+
+image_storage = ContentAddressedStorage()
+
+
+def get_image_storage():
+    return image_storage
@@ -1,21 +1,106 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore, Lock
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.contrib.auth.backends import ModelBackend
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from rest_framework.exceptions import Throttled
+
 from .models import CustomUser
 
+_hashing_lock = Lock()
+_hashing_executor = None
+_hashing_slots = None
 
-class EmailAuthBackend(object):
+
+def run_password_hasher(func, *args, **kwargs):
+    """
+    Выполняет хеширование пароля, при PASSWORD_HASHING_WORKERS > 0 - в
+    ограниченном пуле потоков процесса.
+
+    Поток запроса ждет результата в любом случае. Пул ограничивает число
+    паролей, одновременно хешируемых процессом, PASSWORD_HASHING_WORKERS,
+    ожидают очереди не более PASSWORD_HASHING_QUEUE запросов, остальные
+    через PASSWORD_HASHING_TIMEOUT секунд получают ответ 429. Так вход не
+    занимает все потоки процесса gunicorn (GUNICORN_THREADS), и остальные
+    запросы обслуживаются. С синхронными процессами (GUNICORN_THREADS=1)
+    ограничение не срабатывает, проверка users.W001 предупреждает об этом.
+    При PASSWORD_HASHING_WORKERS=0 пароль хешируется в потоке запроса без
+    пула и ограничений.
+    """
+
+    global _hashing_executor, _hashing_slots
+
+    workers = settings.PASSWORD_HASHING_WORKERS
+    if not workers:
+        return func(*args, **kwargs)
+
+    with _hashing_lock:
+        if _hashing_executor is None:
+            _hashing_executor = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="password-hashing"
+            )
+            _hashing_slots = BoundedSemaphore(
+                workers + settings.PASSWORD_HASHING_QUEUE
+            )
+
+    if not _hashing_slots.acquire(timeout=settings.PASSWORD_HASHING_TIMEOUT):
+        raise Throttled(
+            wait=settings.PASSWORD_HASHING_TIMEOUT,
+            detail="Слишком много попыток входа, повторите позже.",
+        )
+    try:
+        return _hashing_executor.submit(func, *args, **kwargs).result()
+    finally:
+        _hashing_slots.release()
+
+
+class EmailAuthBackend(ModelBackend):
     """
     Аутентификация пользователя по адресу электронной почты и паролю.
+
+    Адрес сравнивается без учета регистра по индексу lower(email), поиск
+    пользователя выполняется одним запросом. Для неизвестного адреса
+    пароль все равно хешируется, чтобы время ответа не выдавало,
+    зарегистрирован ли адрес. При входе через админку (аргумент username)
+    пользователя можно найти и по имени пользователя.
     """
 
-    def authenticate(self, request, username=None, password=None):
-        try:
-            user = CustomUser.objects.get(email=username)
-            if user.check_password(password):
-                return user
-        except CustomUser.DoesNotExist:
+    def authenticate(
+        self, request, username=None, password=None, email=None, **kwargs
+    ):
+        login = email if email is not None else username
+        if login is None or password is None:
+            return None
+
+        lookup = Q(email_lower=login.lower())
+        if email is None:
+            lookup |= Q(username=login)
+        users = list(
+            CustomUser.objects.alias(email_lower=Lower("email")).filter(
+                lookup
+            )[:2]
+        )
+        # Совпадение по email приоритетнее совпадения по имени пользователя
+        user = next(
+            (user for user in users if user.email.lower() == login.lower()),
+            users[0] if users else None,
+        )
+
+        if user is None:
+            run_password_hasher(hashers.make_password, password)
             return None
 
-    def get_user(self, user_id):
-        try:
-            return CustomUser.objects.get(pk=user_id)
-        except CustomUser.DoesNotExist:
+        rehash = []
+        is_valid = run_password_hasher(
+            hashers.check_password, password, user.password, rehash.append
+        )
+        if not is_valid or not self.user_can_authenticate(user):
             return None
+        if rehash:
+            user.set_password(password)
+            user.save(update_fields=["password"])
+        return user
@@ -0,0 +1,102 @@
+from time import time
+
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import (
+    AuthenticationFailed,
+    InvalidToken,
+)
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import CustomUser
+
+REVOKED_TOKEN_KEY = "jwt:revoked:{}"
+REVOKED_BEFORE_KEY = "jwt:revoked_before:{}"
+
+
+def revoke_token(token):
+    """
+    Добавляет токен в список отозванных до окончания срока его действия.
+    """
+
+    timeout = max(int(token["exp"] - time()), 1)
+    cache.set(
+        REVOKED_TOKEN_KEY.format(token[api_settings.JTI_CLAIM]), True, timeout
+    )
+
+
+def revoke_user_tokens(user_id):
+    """
+    Отзывает все выпущенные ранее токены пользователя.
+    """
+
+    cache.set(
+        REVOKED_BEFORE_KEY.format(user_id),
+        int(time()),
+        int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()),
+    )
+
+
+def is_token_revoked(token):
+    """
+    Проверяет токен по списку отозванных одним обращением к кешу.
+    """
+
+    jti_key = REVOKED_TOKEN_KEY.format(token[api_settings.JTI_CLAIM])
+    before_key = REVOKED_BEFORE_KEY.format(token[api_settings.USER_ID_CLAIM])
+    revoked = cache.get_many([jti_key, before_key])
+    return jti_key in revoked or token.get("iat", 0) <= revoked.get(
+        before_key, float("-inf")
+    )
+
+
+class LazyTokenUser(SimpleLazyObject):
+    """
+    Пользователь из подписанного токена
+
+    id и признаки аутентификации берутся из токена, запись пользователя
+    загружается из базы только при обращении к остальным полям модели.
+    """
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, user_id):
+        self.__dict__["_user_id"] = user_id
+        super().__init__(self._load_user)
+
+    @property
+    def id(self):
+        return self.__dict__["_user_id"]
+
+    pk = id
+
+    def __bool__(self):
+        return True
+
+    def _load_user(self):
+        user = CustomUser.objects.filter(pk=self.id, is_active=True).first()
+        if user is None:
+            raise AuthenticationFailed("Пользователь не найден.")
+        return user
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    Аутентификация по подписанному токену без обращения к базе данных
+    """
+
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        if is_token_revoked(validated_token):
+            raise InvalidToken("Токен отозван.")
+        return validated_token
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Токен не содержит идентификатор пользователя.")
+        return LazyTokenUser(user_id)
@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+
+# Кеши, которые не разделяются между процессами или не хранят данные
+PROCESS_LOCAL_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+@register()
+def check_revocation_cache(app_configs, **kwargs):
+    """
+    Список отозванных JWT хранится в кеше, поэтому кеш должен быть общим
+    для процессов gunicorn и переживать их перезапуск после max_requests.
+    """
+
+    if not settings.JWT_AUTH:
+        return []
+    backend = settings.CACHES["default"]["BACKEND"]
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        Error(
+            f"JWT_AUTH=True несовместим с кешем {backend}: отозванные "
+            "токены снова станут действительными после перезапуска "
+            "процесса или в другом процессе.",
+            hint="Задайте общий CACHE_BACKEND, например FileBasedCache "
+            "или RedisCache.",
+            id="users.E001",
+        )
+    ]
+
+
+@register()
+def check_password_hashing_pool(app_configs, **kwargs):
+    """
+    Запрос сверх пула и очереди хеширования получает 429, только если
+    процесс gunicorn обслуживает больше запросов одновременно.
+    """
+
+    workers = settings.PASSWORD_HASHING_WORKERS
+    slots = workers + settings.PASSWORD_HASHING_QUEUE
+    if not workers or slots < settings.GUNICORN_THREADS:
+        return []
+    return [
+        Warning(
+            f"PASSWORD_HASHING_WORKERS + PASSWORD_HASHING_QUEUE ({slots}) "
+            f"не меньше GUNICORN_THREADS ({settings.GUNICORN_THREADS}): "
+            "ограничение хеширования паролей не срабатывает.",
+            hint="Увеличьте GUNICORN_THREADS или уменьшите очередь.",
+            id="users.W001",
+        )
+    ]
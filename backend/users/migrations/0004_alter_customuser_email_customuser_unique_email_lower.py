@@ -0,0 +1,48 @@
+# Generated by Django 4.2.18 on 2026-10-19 07:38
+
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.functions.text
+
+
+# Учетные записи с email, различающимся только регистром, не объединяются
+# автоматически: у них могут быть свои рецепты, подписки и пароли
+def check_case_duplicates(apps, schema_editor):
+    CustomUser = apps.get_model("users", "CustomUser")
+    duplicates = list(
+        CustomUser.objects.annotate(
+            email_lower=django.db.models.functions.text.Lower("email")
+        )
+        .values("email_lower")
+        .annotate(count=Count("id"))
+        .filter(count__gt=1)
+        .values_list("email_lower", flat=True)
+    )
+    if duplicates:
+        raise RuntimeError(
+            "Email нескольких пользователей различается только регистром, "
+            "измените или объедините эти учетные записи и повторите "
+            "миграцию: " + ", ".join(sorted(duplicates))
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_remove_customuser_is_subscribed'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            check_case_duplicates, migrations.RunPython.noop
+        ),
+        migrations.AlterField(
+            model_name='customuser',
+            name='email',
+            field=models.EmailField(max_length=254),
+        ),
+        migrations.AddConstraint(
+            model_name='customuser',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), name='unique_email_lower', violation_error_message='Пользователь с таким email уже существует.'),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.db.models import CheckConstraint, F, Q, UniqueConstraint
+from django.db.models.functions import Lower
 
 from api.constants import USER_MODEL_MAX_LENGTH
 
@@ -19,13 +20,20 @@ class CustomUser(AbstractUser):
         verbose_name="Фамилия",
     )
     email = models.EmailField(
-        unique=True,
         max_length=254,
     )
 
     class Meta:
         verbose_name = "Пользователь"
         verbose_name_plural = "Пользователи"
+        constraints = [
+            UniqueConstraint(
+                Lower("email"),
+                name="unique_email_lower",
+                violation_error_message="Пользователь с таким email "
+                "уже существует.",
+            ),
+        ]
 
     def __str__(self):
         return self.username